@@ -17,17 +17,20 @@ def sign(x):
         return -1
 
 
-def draw_line(p_list, algorithm):
+def draw_line(p_list, algorithm, spans=False):
     """绘制线段
 
     :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 线段的起点和终点坐标
     :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'，此处的'Naive'仅作为示例，测试时不会出现
+    :param spans: (bool) 为True时不生成逐个像素，直接返回同一行上相邻像素合并成的水平区间，见line_spans
     :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
     """
     if len(p_list) == 0:
         return []
     x0, y0 = p_list[0]
     x1, y1 = p_list[1]
+    if spans:
+        return line_spans(x0, y0, x1, y1, algorithm)
     result = []
     if algorithm == 'Naive':
         if x0 == x1:
@@ -79,135 +82,304 @@ def draw_line(p_list, algorithm):
     return result
 
 
-def draw_polygon(p_list, algorithm):
+# Subroutine of draw_line
+def line_spans(x0, y0, x1, y1, algorithm):
+    """按行输出线段的像素：每行一个区间，结果与draw_line的像素集合相同，占用的内存只与线段跨越的行数有关
+
+    Bresenham算法中第i步的副方向步数为 (2·dy·i + dx - 1) // (2·dx)，x为主方向时直接求出每行的起止步，不逐个像素计算；
+    DDA与Naive的取整依赖逐步累加，仍逐步计算，但只保留当前行的区间，不生成像素列表
+    :return: (list of list of int: [[y, x_start, x_end], ...]) 沿线段方向排列的区间，x_start <= x_end
+    """
+    result = []
+    if algorithm == 'Bresenham':
+        dx, dy = abs(x1 - x0), abs(y1 - y0)
+        sx, sy = sign(x1 - x0), sign(y1 - y0)
+        if dy > dx:                                             # y为主方向：每行恰好一个像素
+            for i in range(dy + 1):
+                x = x0 + sx * ((2 * dx * i + dy - 1) // (2 * dy))
+                result.append([y0 + sy * i, x, x])
+            return result
+        if dy == 0:
+            return [[y0, min(x0, x1), max(x0, x1)]]
+        start = 0
+        for m in range((2 * dy * dx + dx - 1) // (2 * dx) + 1):
+            # 第m + 1行从满足 2·dy·i + dx - 1 >= 2·dx·(m + 1) 的最小的i开始，第m行到它的前一步为止
+            end = min(-((dx - 1 - 2 * dx * (m + 1)) // (2 * dy)) - 1, dx)
+            xa, xb = x0 + sx * start, x0 + sx * end
+            result.append([y0 + sy * m, min(xa, xb), max(xa, xb)])
+            start = end + 1
+        return result
+    # Naive与DDA：像素沿线段方向在x、y上都单调，故同一行的像素连续出现，行号改变时结束当前区间
+    if algorithm == 'Naive':
+        if x0 == x1:
+            return [[y, x0, x0] for y in range(y0, y1 + 1)]
+        if x0 > x1:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        k = (y1 - y0) / (x1 - x0)
+        row, x_start = y0, x0
+        for x in range(x0 + 1, x1 + 1):
+            y = int(y0 + k * (x - x0))
+            if y != row:
+                result.append([row, x_start, x - 1])
+                row, x_start = y, x
+        result.append([row, x_start, x1])
+    elif algorithm == 'DDA':
+        if (x0, y0) == (x1, y1):
+            return [[y0, x0, x0]]
+        length = max(abs(x1 - x0), abs(y1 - y0))
+        dx, dy = (x1 - x0) / length, (y1 - y0) / length
+        x, y = x0, y0
+        row, x_start = int(y + 0.5), int(x + 0.5)
+        x_end = x_start
+        for i in range(0, length + 1):
+            px, py = int(x + 0.5), int(y + 0.5)
+            if py != row:
+                result.append([row, x_start, x_end] if x_start <= x_end else [row, x_end, x_start])
+                row, x_start = py, px
+            x_end = px
+            x = x + dx
+            y = y + dy
+        result.append([row, x_start, x_end] if x_start <= x_end else [row, x_end, x_start])
+    return result
+
+
+def draw_polygon(p_list, algorithm, spans=False):
     """绘制多边形
 
     :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
     :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :param spans: (bool) 为True时返回各边的水平区间，见line_spans；相邻两边在公共顶点处的区间会重叠
     :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
     """
     result = []
     for i in range(len(p_list)):
-        line = draw_line([p_list[i - 1], p_list[i]], algorithm)
+        line = draw_line([p_list[i - 1], p_list[i]], algorithm, spans)
         result += line
     return result
 
 
-def draw_circle(p_list, algorithm=None):
-    """绘制圆(Bresenham算法)
 
-    :param p_list: (list of list of int: [[x0, y0], [x1, y1]])  圆的正方形包围框左上角和右下角顶点坐标
-    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
+def fill_polygon(p_list, rule='evenodd'):
+    """扫描线填充多边形（有序边表 + 活性边表），支持凹多边形与自相交多边形
+
+    每条边覆盖扫描线 y_low <= y < y_high（下端点计入、上端点不计入，顶点处不会重复计数），
+    水平边不参与填充（由轮廓绘制）。交点横坐标用整数分子/分母逐行累加，没有浮点误差
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
+    :param rule: (string) 填充规则，'evenodd'（奇偶规则）或'nonzero'（非零环绕数规则）
+    :return: (list of list of int: [[y, x_start, x_end], ...]) 每条扫描线上的填充区间，x_start <= x <= x_end
     """
+    if rule not in ('evenodd', 'nonzero'):
+        raise ValueError(f'Unknown fill rule: {rule}')
+    # 边表：y_low ---> [[分子, 分子增量, 分母, y_high, 方向], ...]，交点x = 分子 / 分母
+    edge_table = {}
+    for i in range(len(p_list)):
+        (x0, y0), (x1, y1) = p_list[i - 1], p_list[i]
+        if y0 == y1:
+            continue
+        direction = 1 if y0 < y1 else -1
+        if y0 > y1:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        edge_table.setdefault(y0, []).append([x0 * (y1 - y0), x1 - x0, y1 - y0, y1, direction])
+    if not edge_table:
+        return []
+
+    result = []
+    active = []
+    y = min(edge_table)
+    y_end = max(edge[3] for edges in edge_table.values() for edge in edges)
+    while y < y_end:
+        active = [edge for edge in active if edge[3] > y]
+        active += edge_table.get(y, [])
+        active.sort(key=lambda edge: edge[0] / edge[2])
+        winding = 0
+        for edge in active:
+            if rule == 'evenodd':
+                inside_before, winding = winding, winding ^ 1
+            else:
+                inside_before, winding = winding, winding + edge[4]
+            if inside_before == 0 and winding != 0:
+                start = -(-edge[0] // edge[2])                  # ceil
+            elif inside_before != 0 and winding == 0:
+                end = edge[0] // edge[2]                        # floor
+                if start <= end:
+                    result.append([y, start, end])
+        for edge in active:                                     # 下一条扫描线的交点
+            edge[0] += edge[1]
+        y += 1
+    return result
 
-    def mh(x, y, dis):
-        x = x + 1
-        y = y
-        dis = dis + 2 * x + 1
-        return x, y, dis
 
-    def md(x, y, dis):
-        x = x + 1
-        y = y - 1
-        dis = dis + 2 * x - 2 * y + 2
-        return x, y, dis
+def circle_octant(R):
+    """中点圆算法（全整数）生成圆心在原点、半径为R的圆在第二八分圆弧（0 <= x <= y）上的像素
+
+    判别量 d = F(x + 1, y - 1/2) 的4倍减去常数后取整，与逐次比较像素到圆的距离的Bresenham算法结果相同
+    :param R: (int) 半径
+    :return: (list of tuple of int: [(x_0, y_0), (x_1, y_1), ...]) 从(0, R)开始、x递增的像素点坐标列表
+    """
+    x, y = 0, R
+    d = 1 - R
+    result = []
+    while x <= y:
+        result.append((x, y))
+        if d < 0:
+            d += 2 * x + 3
+        else:
+            d += 2 * (x - y) + 5
+            y -= 1
+        x += 1
+    return result
 
-    def mv(x, y, dis):
-        x = x
-        y = y - 1
-        dis = dis - 2 * y + 1
-        return x, y, dis
 
+def draw_circle(p_list, algorithm=None, spans=False):
+    """绘制圆(中点圆算法，八分对称)
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]])  圆的正方形包围框左上角和右下角顶点坐标
+    :param spans: (bool) 为True时不逐个映射像素，直接返回同一行上相邻像素合并成的水平区间，见circle_spans
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表，不含重复像素
+    """
     x0, y0 = p_list[0]
     x1, y1 = p_list[1]
-    result = []
     if x0 != y0 or x1 != y1:
         raise ValueError('To plot a circle, need a square enclosure!')
     # compute center and radius
     cx = (x0 + x1) // 2
     cy = (y0 + y1) // 2
     R = abs(x1 - x0) // 2
-    #print(cx, cy, R)        # TODO: delete
-    # initialize the variables
-    x = 0
-    y = R
-    dis = (x + 1)**2 + (y - 1)**2 - R**2
-    Limit = 0
-    while y >= Limit:
-        result.append((int(cx + x), int(cy + y)))   # in first quadrant
-        result.append((int(cx - x), int(cy + y)))   # in second quadrant
-        result.append((int(cx - x), int(cy - y)))   # in third quadrant
-        result.append((int(cx + x), int(cy - y)))   # in fourth quadrant
-        # if case 1 or 2
-        if dis < 0:
-            delta = 2 * dis + 2 * y - 1
-            # determin whetheer case 1 or case 2
-            if delta <= 0:
-                x, y, dis = mh(x, y, dis)                 # call mh(x, y, dis)
-            else:
-                x, y, dis = md(x, y, dis)                 # call md(x, y, dis)
-        elif dis > 0:
-            delta = 2 * dis - 2 * x - 1
-            if delta <= 0:
-                x, y, dis = md(x, y, dis)                 # call md(x, y, dis)
+    if spans:
+        return circle_spans(cx, cy, circle_octant(R))
+    # 一个八分圆弧按8种对称方式映射；坐标轴与对角线上的像素的映像会重合，跳过重复的映像
+    result = []
+    for x, y in circle_octant(R):
+        for u, v in ((x, y), (y, x)) if x != y else ((x, y),):
+            result.append((cx + u, cy + v))
+            if u:
+                result.append((cx - u, cy + v))
+            if u and v:
+                result.append((cx - u, cy - v))
+            if v:
+                result.append((cx + u, cy - v))
+    return result
+
+
+# Subroutine of draw_circle
+def circle_spans(cx, cy, octant):
+    """将八分圆弧按行合并为区间，再映射到八个八分圆，结果与draw_circle的像素集合相同
+
+    弧上x递增、y不增，y相同的像素相邻，合并后按关于x轴、y轴的对称映射到圆的上下两端；
+    关于对角线的映像在每行只有左右各一个像素，逐个输出
+    :param octant: (list of tuple of int) circle_octant的结果
+    :return: (list of list of int: [[y, x_start, x_end], ...]) 互不相交的区间，x_start <= x_end
+    """
+    runs = []                                   # 同一行的像素x递增，最后一个为区间终点
+    for x, y in octant:
+        if runs and runs[-1][0] == y:
+            runs[-1][2] = x
+        else:
+            runs.append([y, x, x])
+    result = []
+    for y, x_start, x_end in runs:
+        for row in ((cy + y, cy - y) if y else (cy,)):
+            if x_start == 0:                    # 与y轴相交的区间和它的映像连成一个区间
+                result.append([row, cx - x_end, cx + x_end])
             else:
-                x, y, dis = mv(x, y, dis)                 # call mv(x, y, dis)
-        elif dis == 0:
-            x, y, dis = md(x, y, dis)                     # call md(x, y, dis)
-    # finish
+                result.append([row, cx + x_start, cx + x_end])
+                result.append([row, cx - x_end, cx - x_start])
+    for x, y in octant:
+        if x == y:                              # 对角线上的像素关于对角线的映像是它自身
+            continue
+        for row in ((cy + x, cy - x) if x else (cy,)):
+            result.append([row, cx + y, cx + y])
+            if y:
+                result.append([row, cx - y, cx - y])
+    return result
+
+
+def ellipse_quadrant(a, b):
+    """中点椭圆算法（全整数）生成中心在原点、半轴为a、b的椭圆在第一象限的像素
+
+    区域1从(a, 0)出发y递增，区域2中x递减至0；判别量取原浮点判别量的2倍，全部为整数，判别结果不变
+    :param a, b: (int) x、y方向的半轴长
+    :return: (list of tuple of int: [(x_0, y_0), (x_1, y_1), ...]) 沿弧排列的像素点坐标列表
+    """
+    aa, bb = a * a, b * b
+    x, y = a, 0
+    result = []
+    # initialize the decision variables in region 1
+    d1 = 4 * bb * x * (x - 1) + bb + 4 * aa * (1 - bb)
+    while bb * (2 * x - 1) > 2 * aa * (y + 1):          # start in region 1
+        result.append((x, y))
+        if d1 < 0:
+            y += 1
+            d1 += 8 * aa * y + 4 * aa
+        else:
+            x -= 1
+            y += 1
+            d1 += 8 * aa * y - 8 * bb * x + 4 * aa
+    # initialize the decision variables in region 2
+    d2 = 4 * bb * (x * x + 1) - 8 * bb * x + 4 * aa * (y * y + y - bb) + aa
+    while x >= 0:                                       # start in region 2
+        result.append((x, y))
+        if d2 < 0:
+            x -= 1
+            y += 1
+            d2 += 8 * aa * y - 8 * bb * x + 4 * bb
+        else:
+            x -= 1
+            d2 += 4 * bb - 8 * bb * x
     return result
 
 
-def draw_ellipse(p_list, algorithm=None):
-    """绘制椭圆（采用中点圆生成算法）       refer to 2.5 Efficient midpoint ellipse algorithm
+def draw_ellipse(p_list, algorithm=None, spans=False):
+    """绘制椭圆（采用中点椭圆生成算法，四分对称）       refer to 2.5 Efficient midpoint ellipse algorithm
 
     :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框左上角和右下角顶点坐标
-    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
+    :param spans: (bool) 为True时不逐个映射像素，直接返回同一行上相邻像素合并成的水平区间，见ellipse_spans
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表，不含重复像素
     """
     x0, y0 = p_list[0]
     x1, y1 = p_list[1]
-    result = []
     # compute center and radius
     cx = (x0 + x1) // 2         # symmetric center coordinates are rounded down
     cy = (y0 + y1) // 2
     a = abs(x1 - x0) // 2       # semi-axes are alse rounded down
     b = abs(y1 - y0) // 2
-    # initialize the variables
-    x = int(a + 1/2)
-    y = 0
-    # define temporary variables
-    taa, t2aa, t4aa = a*a, 2*a*a, 4*a*a
-    tbb, t2bb, t4bb = b*b, 2*b*b, 4*b*b
-    t2abb = 2*a*b*b
-    t2bbx = 2*b*b*x
-    # initialize the decision variables in region 1
-    d1 = t2bbx * (x - 1) + tbb / 2 + t2aa * (1 - tbb)
-    while tbb * (x - 1/2) > taa * (y + 1):          # start in region 1
-        result.append((int(cx + x), int(cy + y)))   # in first quadrant
-        result.append((int(cx - x), int(cy + y)))   # in second quadrant
-        result.append((int(cx - x), int(cy - y)))   # in third quadrant
-        result.append((int(cx + x), int(cy - y)))   # in fourth quadrant
-        if d1 < 0:
-            y = y + 1
-            d1 = d1 + t4aa * y + t2aa
-        else:
-            x = x - 1
-            y = y + 1
-            d1 = d1 + t4aa * y - t4bb * x + t2aa
-    # initialize the decision variables in region 2
-    d2 = t2bb * (x*x + 1) - t4bb * x + t2aa * (y*y + y -tbb) + taa / 2
-    while x >= 0:                                   # start in region 2
-        result.append((int(cx + x), int(cy + y)))   # in first quadrant
-        result.append((int(cx - x), int(cy + y)))   # in second quadrant
-        result.append((int(cx - x), int(cy - y)))   # in third quadrant
-        result.append((int(cx + x), int(cy - y)))   # in fourth quadrant
-        if d2 < 0:
-            x = x - 1
-            y = y + 1
-            d2 = d2 + t4aa * y - t4bb * x + t2bb
+    if spans:
+        return ellipse_spans(cx, cy, ellipse_quadrant(a, b))
+    # 四个象限对称映射；坐标轴上的像素的映像会重合，跳过重复的映像
+    result = []
+    for x, y in ellipse_quadrant(a, b):
+        result.append((cx + x, cy + y))         # in first quadrant
+        if x:
+            result.append((cx - x, cy + y))     # in second quadrant
+        if x and y:
+            result.append((cx - x, cy - y))     # in third quadrant
+        if y:
+            result.append((cx + x, cy - y))     # in fourth quadrant
+    return result
+
+
+# Subroutine of draw_ellipse
+def ellipse_spans(cx, cy, quadrant):
+    """将第一象限的弧按行合并为区间，再按区间映射到四个象限，结果与draw_ellipse的像素集合相同
+
+    弧上y单调不减，同一行的像素相邻（区域2中椭圆的上下两端），合并后输出的区间数只与椭圆跨越的行数有关
+    :param quadrant: (list of tuple of int) ellipse_quadrant的结果
+    :return: (list of list of int: [[y, x_start, x_end], ...]) 互不相交的区间，x_start <= x_end
+    """
+    runs = []                                   # 同一行的像素x递减，最后一个为区间起点
+    for x, y in quadrant:
+        if runs and runs[-1][0] == y:
+            runs[-1][1] = x
         else:
-            x = x - 1
-            d2 = d2 - t4bb * x + t2bb
+            runs.append([y, x, x])
+    result = []
+    for y, x_start, x_end in runs:
+        for row in ((cy + y, cy - y) if y else (cy,)):
+            if x_start == 0:                    # 与y轴相交的区间和它的映像连成一个区间
+                result.append([row, cx - x_end, cx + x_end])
+            else:
+                result.append([row, cx + x_start, cx + x_end])
+                result.append([row, cx - x_end, cx - x_start])
     return result
 
 
@@ -319,10 +491,11 @@ def rotate(p_list, rx, ry, r):
     # print(rx, ry, r)
     result = []
     rad = r / 180 * math.pi
+    cos, sin = math.cos(rad), math.sin(rad)         # 所有点共用同一组三角函数值
     for x, y in p_list:
         x, y = x - rx,  y - ry
-        x_t = x * math.cos(rad) - y * math.sin(rad)
-        y_t = x * math.sin(rad) + y * math.cos(rad)
+        x_t = x * cos - y * sin
+        y_t = x * sin + y * cos
         result.append((int(x_t + rx), int(y_t + ry)))
     return result
 
@@ -360,49 +533,35 @@ def clip(p_list, x_min, y_min, x_max, y_max, algorithm):
     :return: (list of list of int: [[x_0, y_0], [x_1, y_1]]) 裁剪后线段的起点和终点坐标
     """
     if algorithm == 'Cohen-Sutherland':
-        p1, p2 = p_list[0], p_list[1]
-        Window = [x_min, x_max, y_min, y_max]
-        p1_code = EndPoint(p1, Window)
-        p2_code = EndPoint(p2, Window)
-        sum1 = Sum(p1_code)
-        sum2 = Sum(p2_code)
-        Vflag = Visible(p1_code, p2_code, sum1, sum2)
-        if Vflag == 'yes':
+        p1, p2 = list(p_list[0]), list(p_list[1])      # 求交时修改端点，不改动传入的p_list
+        o1, o2 = p_list[0], p_list[1]                   # 端点的原始坐标
+        code1 = outcode(p1, x_min, y_min, x_max, y_max)
+        code2 = outcode(p2, x_min, y_min, x_max, y_max)
+        if code1 | code2 == 0:          # 完全可见
             return p_list
-        elif Vflag == 'no':
+        if code1 & code2:               # 两端点在同一条边界外侧，完全不可见
             return []
-        Iflag = 1   # initailize Iflag
-        if p1[0] == p2[0]:
-            Iflag = -1      # vertical line
-        elif p1[1] == p2[1]:
-            Iflag = 0       # horizontal line
-        else:
+        vertical = p1[0] == p2[0]
+        if not vertical:
             Slope = (p2[1] - p1[1]) / (p2[0] - p1[0])
-        while Vflag == 'partial':
-            for i in range(4):
-                if p1_code[3 - i] != p2_code[3 - i]:
-                    if p1_code[3 - i] == 0:     # if p1 is inside, swap end points, p_codes, sums
-                        p1, p2 = p2, p1
-                        p1_code, p2_code = p2_code, p1_code
-                        sum1, sum2 = sum2, sum1
-                    # find intersections with the window edges
-                    # select the appropriate intersection routine
-                    if Iflag != -1 and i <= 1:      # left and right edges
-                        p1[1] = int(Slope * (Window[i] - p1[0]) + p1[1])
-                        p1[0] = Window[i]
-                        p1_code = EndPoint(p1, Window)
-                        sum1 = Sum(p1_code)
-                    if Iflag != 0 and i > 1:
-                        if Iflag != -1:
-                            p1[0] = int((1 / Slope) * (Window[i] - p1[1]) + p1[0])
-                        p1[1] = Window[i]
-                        p1_code = EndPoint(p1, Window)
-                        sum1 = Sum(p1_code)
-                    Vflag = Visible(p1_code, p2_code, sum1, sum2)
-                    if Vflag == 'yes':
-                        return [p1, p2]
-                    elif Vflag == 'no':
-                        return []
+        while True:
+            for edge, bound in ((LEFT, x_min), (RIGHT, x_max), (BOTTOM, y_min), (TOP, y_max)):
+                if not (code1 ^ code2) & edge:
+                    continue
+                if not code1 & edge:    # 保证p1在该边界外侧
+                    p1, p2, o1, o2 = p2, p1, o2, o1
+                    code1, code2 = code2, code1
+                # 与窗口边界求交，p1移到交点。交点总是由端点的原始坐标求得，
+                # 若由上次取整后的交点再求，误差累积可能使端点在两条边界间来回移动而不终止
+                if edge & (LEFT | RIGHT):
+                    p1 = [bound, int(Slope * (bound - o1[0]) + o1[1])]
+                else:
+                    p1 = [o1[0] if vertical else int((1 / Slope) * (bound - o1[1]) + o1[0]), bound]
+                code1 = outcode(p1, x_min, y_min, x_max, y_max)
+                if code1 | code2 == 0:
+                    return [p1, p2]
+                if code1 & code2:
+                    return []
     elif algorithm == 'Liang-Barsky':
         (x1, y1), (x2, y2) = p_list[0], p_list[1]
         t_range = [0, 1]        # [tL, tU]
@@ -420,49 +579,25 @@ def clip(p_list, x_min, y_min, x_max, y_max, algorithm):
         return [[x1, y1], [x2, y2]]
 
 # Subroutines of clip(Cohen--Sutherland)
-def Visible(p1_code, p2_code, sum1, sum2):
-    """可见性判断
-    :param p1_code, p2_code: (lsit of int) 1x4的数组，表示端点编码
-    :param sum1, sum2: (int) 对端点编码的各位求和，以判断线段与裁剪框的逻辑相交
-    :return (int: Vflag) 可见性(完全可见，完全不可见，部分可见)
-    """
-    Vflag = 'partial'   # assume the line is partially visible
-    if sum1 == 0 and sum2 == 0: # check if the line is totaly visible
-        Vflag = 'yes'
-    else:               # check if the line is trivially invisible
-        Inter = Logical(p1_code, p2_code)
-        if Inter != 0:  # Inter is non-zero, which means trivially invisible
-            Vflag = 'no'
-    return Vflag
-
-def EndPoint(p_list, Window):
-    """端点编码:
-    :param p_list: (list of int) 端点横、纵坐标
-    :param Window: (list of int) 裁剪边框的左右下上范围
-    :return (list of int: p_code) 1x4的数组，端点编码  
-    """
-    x_L, x_R, y_B, y_T = Window
-    p_x, p_y = p_list
-    # p_code = [p_y > y_T, p_y < y_B, p_x > x_R, p_x < x_L]
-    # return p_code
-    return [int(p_y > y_T), int(p_y < y_B), int(p_x > x_R), int(p_x < x_L)]
-
-def Sum(p_code):
-    """编码各位求和
-    :param p_code: (list of int) 1x4的数组，表示端点编码
-    :return (int: sum) 编码各位求和结果
-    """
-    return sum(p_code)
+# 端点编码的各位：端点在对应窗口边界的外侧时置1
+LEFT, RIGHT, BOTTOM, TOP = 1, 2, 4, 8
+
 
-def Logical(p1_code, p2_code):
-    """逻辑相交
-    :param p1_code, p2_code: (list of int) 1x4的数组，表示端点编码
-    :return (int: Inter) 对端点编码的各位求和，以判断线段与裁剪框的逻辑相交
+def outcode(p, x_min, y_min, x_max, y_max):
+    """端点编码
+    :param p: (list of int) 端点横、纵坐标
+    :return (int: code) 按位组合的LEFT、RIGHT、BOTTOM、TOP，为0表示端点在窗口内
     """
-    Inter = 0
-    for i in range(4):
-        Inter += (p1_code[i] + p2_code[i]) >> 1
-    return Inter
+    code = 0
+    if p[0] < x_min:
+        code |= LEFT
+    elif p[0] > x_max:
+        code |= RIGHT
+    if p[1] < y_min:
+        code |= BOTTOM
+    elif p[1] > y_max:
+        code |= TOP
+    return code
 
 # Subroutine of clip(Liang-Barsky)
 def clipt(d, q, t_range):
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# 批量执行指令文件：多个脚本分配到进程池中并行处理，每个进程只需启动一次解释器并导入一次NumPy/PIL
+# 用法: python cg_batch.py output_root script1.txt script2.txt scripts_dir/ ... [-j 8]
+
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+import cg_cli
+import cg_io
+
+
+def collect_scripts(paths):
+    """展开输入路径，目录按文件名排序取其中的全部.txt指令文件
+
+    :param paths: (list of string) 指令文件或目录
+    :return: (list of string) 指令文件路径
+    """
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith('.txt'):
+                    scripts.append(os.path.join(path, name))
+        else:
+            scripts.append(path)
+    return scripts
+
+
+def assign_output_dirs(scripts, output_root):
+    """每个脚本输出到output_root下以脚本名命名的独立目录，重名时追加序号"""
+    used = set()
+    output_dirs = []
+    for script in scripts:
+        stem = os.path.splitext(os.path.basename(script))[0]
+        name, n = stem, 1
+        while name in used:
+            name = f'{stem}_{n}'
+            n += 1
+        used.add(name)
+        output_dirs.append(os.path.join(output_root, name))
+    return output_dirs
+
+
+def run_one(script, output_dir, options):
+    """在工作进程中执行一个脚本，异常只记录不外抛，保证单个脚本失败不影响其余脚本
+
+    :param options: (dict) 传给cg_cli.run_script的其余参数
+    :return: (dict) 该脚本的执行结果
+    """
+    start = time.perf_counter()
+    try:
+        cg_cli.run_script(script, output_dir, **options)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return {'script': script, 'output_dir': output_dir, 'ok': error is None,
+            'seconds': time.perf_counter() - start, 'error': error}
+
+
+def run_batch(scripts, output_root, workers=None, **options):
+    """用进程池并行执行全部脚本
+
+    :param scripts: (list of string) 指令文件路径
+    :param output_root: (string) 输出根目录
+    :param workers: (int) 工作进程数，None表示CPU核数
+    :param options: 传给cg_cli.run_script的其余参数，如adaptive_curves、fmt、compress_level
+    :return: (dict) 汇总结果，results按输入顺序排列
+    """
+    output_dirs = assign_output_dirs(scripts, output_root)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_one, script, output_dir, options)
+                   for script, output_dir in zip(scripts, output_dirs)]
+        results = [future.result() for future in futures]
+    failed = [result for result in results if not result['ok']]
+    return {'total': len(results), 'succeeded': len(results) - len(failed), 'failed': len(failed),
+            'wall_seconds': time.perf_counter() - start,
+            'script_seconds': sum(result['seconds'] for result in results),
+            'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output_root', help='输出根目录，每个脚本写入其下的同名子目录')
+    parser.add_argument('inputs', nargs='+', help='指令文件或包含指令文件(.txt)的目录')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='工作进程数，默认为CPU核数')
+    parser.add_argument('--adaptive-curves', action='store_true', help='曲线按平直度自适应细分后用直线连接')
+    parser.add_argument('--format', default='bmp', choices=list(cg_io.FORMATS), help='默认输出格式，saveCanvas可单独指定')
+    parser.add_argument('--compress-level', type=int, default=6, choices=range(10), help='PNG压缩等级，0最快，9最小')
+    parser.add_argument('--summary', help='将汇总结果写入该JSON文件')
+    args = parser.parse_args()
+
+    summary = run_batch(collect_scripts(args.inputs), args.output_root, args.workers,
+                        adaptive_curves=args.adaptive_curves, fmt=args.format, compress_level=args.compress_level)
+    for result in summary['results']:
+        if not result['ok']:
+            print(f"FAILED {result['script']}\n{result['error']}", file=sys.stderr)
+    print(f"{summary['succeeded']}/{summary['total']} scripts succeeded, {summary['failed']} failed, "
+          f"wall {summary['wall_seconds']:.2f}s, script total {summary['script_seconds']:.2f}s")
+    if args.summary:
+        with open(args.summary, 'w') as fp:
+            json.dump(summary, fp, indent=2)
+    sys.exit(1 if summary['failed'] else 0)
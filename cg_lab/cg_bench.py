@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# 性能基准：合成指令文件生成器、cg_algorithms各函数与cg_cli整体流程的计时，结果保存为JSON并可与基线比较
+# 用法: python cg_bench.py [--quick] [--output result.json] [--baseline baseline.json] [--filter 'alg.draw_line.*']
+#       python cg_bench.py --check    检查向量化实现与cg_algorithms的结果是否逐像素一致
+# 与基线比较时，任一项的最短耗时超过 基线 * (1 + 阈值) 即视为性能回退，退出码为1
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import fnmatch
+import argparse
+import platform
+import tempfile
+import statistics
+import numpy as np
+import cg_algorithms as alg
+import cg_vectorized as vec
+import cg_cli
+
+RESULT_VERSION = 1
+
+# 默认回退阈值，按名称通配匹配，先匹配到的生效；整体流程含磁盘IO，波动更大
+DEFAULT_THRESHOLDS = {
+    'cli.*': 0.50,
+    '*': 0.25,
+}
+
+# 图元类型 ---> 在合成脚本中出现的权重
+DEFAULT_MIX = {
+    'line': 4,
+    'polygon': 2,
+    'circle': 1,
+    'ellipse': 1,
+    'bezier': 1,
+    'bspline': 1,
+}
+
+PROFILES = {
+    # 默认规模，约几秒
+    'default': dict(items=400, width=800, height=800, line_length=(20, 400), control_points=(4, 8),
+                    transforms=0.3, clips=0.1, saves=3, repeat=7),
+    # 快速冒烟检查
+    'quick': dict(items=60, width=300, height=300, line_length=(10, 150), control_points=(4, 6),
+                  transforms=0.3, clips=0.1, saves=1, repeat=5),
+}
+
+
+def generate_items(seed, items, width, height, mix=None, line_length=(20, 400), control_points=(4, 8)):
+    """生成随机图元
+
+    :param seed: (int) 随机种子，相同参数与种子生成相同的图元
+    :param items: (int) 图元个数
+    :param width, height: (int) 画布大小，图元的控制点都落在画布内
+    :param mix: (dict) 图元类型 ---> 权重，见DEFAULT_MIX
+    :param line_length: (int, int) 线段、多边形边长、圆与椭圆直径、曲线控制点散布范围的最小值与最大值
+    :param control_points: (int, int) 多边形顶点数与曲线控制点数的最小值与最大值
+    :return: (list of list) [[kind, p_list], ...]，kind为DEFAULT_MIX中的类型
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+
+    def clamp(x, y):
+        return [min(max(int(x), 0), width - 1), min(max(int(y), 0), height - 1)]
+
+    def walk(n):    # 相邻点距离在line_length范围内的折线
+        p_list = [[rng.randrange(width), rng.randrange(height)]]
+        for _ in range(n - 1):
+            length = rng.uniform(*line_length)
+            angle = rng.uniform(0, 2 * math.pi)
+            p_list.append(clamp(p_list[-1][0] + length * math.cos(angle), p_list[-1][1] + length * math.sin(angle)))
+        return p_list
+
+    def box(square):
+        x0, y0 = rng.randrange(width - 1), rng.randrange(height - 1)
+        w = min(int(rng.uniform(*line_length)), width - 1 - x0)
+        h = min(int(rng.uniform(*line_length)), height - 1 - y0)
+        if square:      # draw_circle要求包围框两个顶点都在对角线x == y上
+            x0 = y0 = min(x0, y0)
+            w = h = min(w, h, min(width, height) - 1 - x0)
+        return [[x0, y0], [x0 + max(w, 1), y0 + max(h, 1)]]
+
+    result = []
+    for kind in rng.choices(kinds, weights, k=items):
+        if kind == 'line':
+            p_list = walk(2)
+        elif kind == 'polygon':
+            p_list = walk(rng.randint(max(control_points[0], 3), max(control_points[1], 3)))
+        elif kind in ('circle', 'ellipse'):
+            p_list = box(kind == 'circle')
+        elif kind == 'bezier':
+            p_list = walk(rng.randint(max(control_points[0], 2), max(control_points[1], 2)))
+        else:
+            p_list = walk(rng.randint(max(control_points[0], 4), max(control_points[1], 4)))
+        result.append([kind, p_list])
+    return result
+
+
+def generate_script(seed, items, width, height, mix=None, line_length=(20, 400), control_points=(4, 8),
+                    transforms=0.3, clips=0.1, saves=3, **unused):
+    """生成cg_cli指令文件
+
+    :param transforms: (float) 每个图元之后追加一条平移/旋转/缩放指令的概率
+    :param clips: (float) 每条线段之后追加一条裁剪指令的概率
+    :param saves: (int) saveCanvas的次数，均匀分布在脚本中，最后一次在脚本末尾
+    其余参数见generate_items
+    :return: (list of string) 指令行
+    """
+    rng = random.Random(seed + 1)
+    lines = [f'resetCanvas {width} {height}']
+    save_every = max(items // max(saves, 1), 1)
+    n_saves = 0
+    all_items = generate_items(seed, items, width, height, mix, line_length, control_points)
+    for i, (kind, p_list) in enumerate(all_items):
+        if rng.random() < 0.3:
+            lines.append('setColor {} {} {}'.format(*(rng.randrange(256) for _ in range(3))))
+        coords = ' '.join(f'{x} {y}' for x, y in p_list)
+        item_id = f'{kind}{i}'
+        if kind == 'line':
+            lines.append(f'drawLine {item_id} {coords} ' + rng.choice(['DDA', 'Bresenham']))
+            if rng.random() < clips:
+                x0, y0 = rng.randrange(width), rng.randrange(height)
+                x1, y1 = rng.randrange(width), rng.randrange(height)
+                lines.append(f'clip {item_id} {x0} {y0} {x1} {y1} ' + rng.choice(['Cohen-Sutherland', 'Liang-Barsky']))
+        elif kind == 'polygon':
+            lines.append(f'drawPolygon {item_id} {coords} ' + rng.choice(['DDA', 'Bresenham']))
+        elif kind == 'circle':
+            lines.append(f'drawCircle {item_id} {coords}')
+        elif kind == 'ellipse':
+            lines.append(f'drawEllipse {item_id} {coords}')
+        else:
+            lines.append(f'drawCurve {item_id} {coords} ' + ('Bezier' if kind == 'bezier' else 'B-spline'))
+        if kind not in ('line', 'circle') and rng.random() < transforms:     # 变换后的圆不再满足draw_circle的输入要求
+            op = rng.choice(['translate', 'rotate', 'scale'])
+            if op == 'translate':
+                lines.append(f'translate {item_id} {rng.randint(-50, 50)} {rng.randint(-50, 50)}')
+            elif op == 'rotate':
+                lines.append(f'rotate {item_id} {rng.randrange(width)} {rng.randrange(height)} {rng.randrange(360)}')
+            else:
+                lines.append(f'scale {item_id} {rng.randrange(width)} {rng.randrange(height)} {rng.choice([0.5, 0.8, 1.2])}')
+        if n_saves < saves - 1 and (i + 1) % save_every == 0:
+            lines.append(f'saveCanvas save{n_saves}')
+            n_saves += 1
+    if saves > 0:
+        lines.append(f'saveCanvas save{n_saves}')
+    return lines
+
+
+def measure(func, repeat=5, min_time=0.05):
+    """多次计时取统计值
+
+    :param func: (callable) 无参数的被测函数
+    :param repeat: (int) 计时轮数
+    :param min_time: (float) 每轮的最短时长（秒），单次调用过快时每轮调用多次，以减小计时误差
+    :return: (dict) 单次调用的耗时统计（秒）
+    """
+    start = time.perf_counter()
+    func()      # 预热：延迟导入、首次内存分配
+    elapsed = time.perf_counter() - start
+    number = max(int(min_time / elapsed), 1) if elapsed > 0 else 1
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return {'median': statistics.median(times), 'min': min(times), 'max': max(times),
+            'repeat': repeat, 'number': number}
+
+
+def algorithm_cases(items, width, height):
+    """cg_algorithms中每个被测函数（及对照的向量化批量版本）对应的工作负载，每个用例一次调用处理同类的全部图元
+
+    :param items: (list of list) generate_items的结果
+    :return: (dict) 名称 ---> (被测函数, 本用例处理的图元数)
+    """
+    by_kind = {}
+    for kind, p_list in items:
+        by_kind.setdefault(kind, []).append(p_list)
+    lines = by_kind.get('line', [])
+    polygons = by_kind.get('polygon', [])
+    shapes = [p_list for kind in ('line', 'polygon', 'bezier', 'bspline') for p_list in by_kind.get(kind, [])]
+    rng = random.Random(0)
+    windows = [sorted(rng.sample(range(width), 2)) + sorted(rng.sample(range(height), 2)) for _ in lines]
+
+    cases = {}
+    for algorithm in ('Naive', 'DDA', 'Bresenham'):
+        cases[f'alg.draw_line.{algorithm}'] = (
+            lambda algorithm=algorithm: [alg.draw_line(p_list, algorithm) for p_list in lines], len(lines))
+    for algorithm in ('DDA', 'Bresenham'):
+        cases[f'alg.draw_polygon.{algorithm}'] = (
+            lambda algorithm=algorithm: [alg.draw_polygon(p_list, algorithm) for p_list in polygons], len(polygons))
+    cases['alg.draw_circle'] = (
+        lambda: [alg.draw_circle(p_list) for p_list in by_kind.get('circle', [])], len(by_kind.get('circle', [])))
+    cases['alg.draw_ellipse'] = (
+        lambda: [alg.draw_ellipse(p_list) for p_list in by_kind.get('ellipse', [])], len(by_kind.get('ellipse', [])))
+    cases['vec.draw_circle'] = (
+        lambda: [vec.draw_circle(p_list) for p_list in by_kind.get('circle', [])], len(by_kind.get('circle', [])))
+    cases['vec.draw_ellipse'] = (
+        lambda: [vec.draw_ellipse(p_list) for p_list in by_kind.get('ellipse', [])], len(by_kind.get('ellipse', [])))
+    cases['alg.draw_curve.Bezier'] = (
+        lambda: [alg.draw_curve(p_list, 'Bezier') for p_list in by_kind.get('bezier', [])],
+        len(by_kind.get('bezier', [])))
+    cases['alg.draw_curve.B-spline'] = (
+        lambda: [alg.draw_curve(p_list, 'B-spline') for p_list in by_kind.get('bspline', [])],
+        len(by_kind.get('bspline', [])))
+    for algorithm in ('Cohen-Sutherland', 'Liang-Barsky'):
+        cases[f'alg.clip.{algorithm}'] = (
+            lambda algorithm=algorithm: [alg.clip([p[:] for p in p_list], x0, y0, x1, y1, algorithm)
+                                         for p_list, (x0, x1, y0, y1) in zip(lines, windows)], len(lines))
+    if lines:       # 全部线段共用一个裁剪窗口时的批量裁剪，与上面的逐条裁剪对照
+        x0, x1, y0, y1 = windows[0]
+        segments = [[*p_list[0], *p_list[1]] for p_list in lines]
+        cases['vec.clip_lines'] = (lambda: vec.clip_lines(segments, x0, y0, x1, y1), len(lines))
+    cases['alg.translate'] = (lambda: [alg.translate(p_list, 10, -10) for p_list in shapes], len(shapes))
+    cases['alg.rotate'] = (lambda: [alg.rotate(p_list, width // 2, height // 2, 30) for p_list in shapes], len(shapes))
+    cases['alg.scale'] = (lambda: [alg.scale(p_list, width // 2, height // 2, 0.8) for p_list in shapes], len(shapes))
+    return cases
+
+
+def run_benchmarks(profile='default', seed=0, pattern='*', **overrides):
+    """执行全部基准
+
+    :param profile: (string) 规模预设，见PROFILES；overrides可覆盖其中的参数
+    :param pattern: (string) 只运行名称与之通配匹配的用例
+    :return: (dict) 可直接保存为JSON的结果
+    """
+    params = dict(PROFILES[profile], **overrides)
+    repeat = params['repeat']
+    items = generate_items(seed, params['items'], params['width'], params['height'], params.get('mix'),
+                           params['line_length'], params['control_points'])
+
+    results = {}
+    for name, (func, n_items) in algorithm_cases(items, params['width'], params['height']).items():
+        if not fnmatch.fnmatchcase(name, pattern) or n_items == 0:
+            continue
+        results[name] = dict(measure(func, repeat), items=n_items)
+
+    script = generate_script(seed, **params)
+    with tempfile.TemporaryDirectory(prefix='cg_bench_') as work_dir:
+        input_file = os.path.join(work_dir, 'input.txt')
+        with open(input_file, 'w') as fp:
+            fp.write('\n'.join(script) + '\n')
+        cli_cases = {
+            'cli.run_script': dict(),
+            'cli.run_script.adaptive': dict(adaptive_curves=True),
+            'cli.run_script.sync_save': dict(save_workers=0),
+        }
+        for name, options in cli_cases.items():
+            if not fnmatch.fnmatchcase(name, pattern):
+                continue
+            output_dir = os.path.join(work_dir, name)
+            timing = measure(lambda: cg_cli.run_script(input_file, output_dir, **options), repeat)
+            results[name] = dict(timing, items=params['items'], commands=len(script))
+
+    return {
+        'version': RESULT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__,
+                    'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count()},
+        'params': dict(params, profile=profile, seed=seed, mix=params.get('mix') or DEFAULT_MIX),
+        'thresholds': DEFAULT_THRESHOLDS,
+        'results': results,
+    }
+
+
+def check_parity(seed=0, degrees=range(20, 41), curves=2, width=600, height=600):
+    """检查vec.draw_curve与alg.draw_curve绘制高次Bezier曲线的结果是否逐像素一致（含顺序）
+
+    :param degrees: (iterable of int) 被检查的曲线次数
+    :param curves: (int) 每个次数随机生成的曲线数
+    :return: (list of string) 不一致的曲线的描述，全部一致时为空
+    """
+    rng = random.Random(seed)
+    mismatches = []
+    for n in degrees:
+        for _ in range(curves):
+            p_list = [[rng.randrange(width), rng.randrange(height)] for _ in range(n + 1)]
+            expected = np.asarray(alg.draw_curve(p_list, 'Bezier'), np.int32).reshape(-1, 2)
+            actual = vec.draw_curve(p_list, 'Bezier')
+            if expected.shape != actual.shape or (expected != actual).any():
+                wrong = (expected != actual).any(axis=1).sum() if expected.shape == actual.shape else len(expected)
+                mismatches.append(f'Bezier degree {n}: {wrong} of {len(expected)} pixels differ, control points {p_list}')
+    return mismatches
+
+
+def threshold_for(name, thresholds):
+    """按通配规则查找用例的回退阈值，thresholds按顺序匹配"""
+    for pattern, threshold in thresholds.items():
+        if fnmatch.fnmatchcase(name, pattern):
+            return threshold
+    return DEFAULT_THRESHOLDS['*']
+
+
+def _workload(params):
+    """决定工作负载的参数，计时轮数不影响比较；经过一次JSON往返以统一元组与列表"""
+    return json.loads(json.dumps({key: value for key, value in params.items() if key != 'repeat'}))
+
+
+def compare(current, baseline):
+    """与基线比较最短耗时（受调度与其他进程干扰最小，比中位数稳定）
+
+    阈值取自基线文件的thresholds，便于针对某台机器单独放宽；两次运行的规模参数不同时比较没有意义
+    :return: (list of dict) 每个共同用例的比较结果，regression为True表示超过阈值
+    """
+    if _workload(current['params']) != _workload(baseline['params']):
+        raise ValueError('benchmark parameters differ from baseline, rerun with the same profile and seed')
+    thresholds = baseline.get('thresholds', DEFAULT_THRESHOLDS)
+    report = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        base = baseline['results'][name]['min']
+        ratio = result['min'] / base if base > 0 else math.inf
+        threshold = threshold_for(name, thresholds)
+        report.append({'name': name, 'baseline': base, 'current': result['min'], 'ratio': ratio,
+                       'threshold': threshold, 'regression': ratio > 1 + threshold})
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', default='default', choices=list(PROFILES), help='规模预设')
+    parser.add_argument('--quick', dest='profile', action='store_const', const='quick', help='等价于--profile quick')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--filter', default='*', help='只运行名称匹配该通配符的用例，如alg.draw_line.*')
+    parser.add_argument('--repeat', type=int, help='覆盖预设中的计时轮数')
+    parser.add_argument('--output', help='将结果写入该JSON文件')
+    parser.add_argument('--baseline', help='与该JSON文件中的结果比较，出现回退时退出码为1')
+    parser.add_argument('--generate', metavar='FILE', help='只生成合成指令文件，不运行基准')
+    parser.add_argument('--check', action='store_true', help='只检查向量化实现与cg_algorithms的一致性，不一致时退出码为1')
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check_parity(args.seed)
+        print('\n'.join(mismatches) or 'vectorized output matches cg_algorithms')
+        sys.exit(1 if mismatches else 0)
+
+    overrides = {'repeat': args.repeat} if args.repeat else {}
+    if args.generate:
+        with open(args.generate, 'w') as fp:
+            fp.write('\n'.join(generate_script(args.seed, **dict(PROFILES[args.profile], **overrides))) + '\n')
+        sys.exit(0)
+
+    current = run_benchmarks(args.profile, args.seed, args.filter, **overrides)
+    for name, result in current['results'].items():
+        print(f"{name:32s} median {result['median'] * 1000:10.2f} ms  min {result['min'] * 1000:10.2f} ms  "
+              f"items {result['items']}")
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(current, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as fp:
+            baseline = json.load(fp)
+        report = compare(current, baseline)
+        for entry in report:
+            flag = 'REGRESSION' if entry['regression'] else 'ok'
+            print(f"{entry['name']:32s} {entry['ratio']:6.2f}x (limit {1 + entry['threshold']:.2f}x)  {flag}")
+        sys.exit(1 if any(entry['regression'] for entry in report) else 0)
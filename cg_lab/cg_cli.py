@@ -3,129 +3,815 @@
 
 import sys
 import os
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
 import cg_algorithms as alg
+import cg_vectorized as vec
+import cg_io
+from cg_profile import NULL_PROFILER, Profiler
 import numpy as np
-from PIL import Image
 
 
-if __name__ == '__main__':
-    input_file = sys.argv[1]
-    output_dir = sys.argv[2]
+def rasterize_items(items, width, height, adaptive_curves=False, profiler=NULL_PROFILER, window=None):
+    """按绘制顺序光栅化图元，返回落在画布（或其中的窗口）内的像素与水平区间
+
+    线段、多边形、圆和椭圆直接按行输出水平区间（线段与多边形的边按算法分组，每组只调用一次vec.line_spans，
+    圆与椭圆各调用一次vec.circle_spans、vec.ellipse_spans），
+    只有曲线逐像素输出。包围盒与窗口不相交的图元直接跳过，线段、多边形的边和曲线段在光栅化前先裁剪到窗口附近，
+    只剩边界附近的少量像素与区间需要剔除或裁剪
+    :param items: (list of [item_type, p_list, algorithm, color, fill]) 按绘制顺序排列的图元
+    :param width, height: (int) 画布大小
+    :param adaptive_curves: (bool) 曲线是否采用自适应细分（连通、无重复像素），否则按包围盒周长均匀采样
+    :param profiler: (cg_profile.Profiler) 记录光栅化与越界剔除的耗时
+    :param window: (list of int) [x_min, y_min, x_max, y_max]，只返回该窗口内的像素，None表示整个画布
+    :return: (np.ndarray of int32: (N, 2), np.ndarray of int: (N,), np.ndarray of int64: (K, 4))
+             曲线的像素坐标及其所属图元在items中的序号，其余图元的区间[y, x_start, x_end, 序号]
+    """
+    if window is None:
+        window = [0, 0, width - 1, height - 1]
+    with profiler.phase('rasterize'):
+        pixels, owners, spans, culled = _rasterize(items, adaptive_curves, window)
+    with profiler.phase('bounds'):
+        x_min, y_min, x_max, y_max = window
+        inside = (pixels[:, 0] >= x_min) & (pixels[:, 0] <= x_max) & (pixels[:, 1] >= y_min) & (pixels[:, 1] <= y_max)
+        pixels, owners = pixels[inside], owners[inside]
+        emitted = len(spans)
+        spans = clip_spans(spans, x_min, y_min, x_max + 1, y_max + 1, translate=False)
+    profiler.count('items_culled', culled)
+    profiler.count('pixels_emitted', len(inside))
+    profiler.count('pixels_outside', len(inside) - len(pixels))
+    profiler.count('spans_emitted', emitted)
+    profiler.count('spans_outside', emitted - len(spans))
+    return pixels, owners, spans
+
+
+def outside_window(p_list, window, margin=2):
+    """图元控制点的包围盒是否完全在外扩margin后的窗口之外
+
+    各类图元的像素都在控制点包围盒外扩1个像素的范围内（曲线在控制多边形的凸包内），此时整个图元都不可见
+    :param window: (list of int) [x_min, y_min, x_max, y_max]
+    """
+    x_min, y_min, x_max, y_max = window
+    xs = [p[0] for p in p_list]
+    ys = [p[1] for p in p_list]
+    return (max(xs) < x_min - margin or min(xs) > x_max + margin or
+            max(ys) < y_min - margin or min(ys) > y_max + margin)
+
+
+def _rasterize(items, adaptive_curves, window):
+    """光栅化图元，结果包含窗口内的全部像素与区间，及其附近的少量窗口外像素与区间
+
+    :return: (np.ndarray of int32: (N, 2), np.ndarray of int: (N,), np.ndarray of int64: (K, 4), int)
+             曲线的像素坐标、所属图元的序号，其余图元的区间[y, x_start, x_end, 序号]，及整个跳过的图元数
+    """
+    batches = {}                # algorithm ---> ([segments], [owner of each segment])
+    conics = {'circle': ([], []), 'ellipse': ([], [])}     # item_type ---> ([p_list], [owner])
+    pixel_list, owner_list = [], []
+    culled = 0
+    for order, (item_type, p_list, algorithm, color, fill) in enumerate(items):
+        if len(p_list) == 0:
+            continue
+        if outside_window(p_list, window):
+            culled += 1
+            continue
+        if item_type in ['line', 'polygon']:
+            segments, owners = batches.setdefault(algorithm, ([], []))
+            if item_type == 'line':
+                segments.append([*p_list[0], *p_list[1]])
+                owners.append(order)
+            else:
+                for i in range(len(p_list)):
+                    segments.append([*p_list[i - 1], *p_list[i]])
+                    owners.append(order)
+        elif item_type in conics:
+            conics[item_type][0].append(p_list)
+            conics[item_type][1].append(order)
+        elif item_type == 'curve':
+            pixels = vec.draw_curve(p_list, algorithm, adaptive=adaptive_curves, window=window)
+            pixel_list.append(pixels)
+            owner_list.append(np.full(len(pixels), order))
+    span_list = [np.empty((0, 4), np.int64)]
+    for algorithm, (segments, owners) in batches.items():
+        spans, counts = vec.line_spans(segments, algorithm, return_counts=True, window=window)
+        span_list.append(np.column_stack((spans, np.repeat(owners, counts))))
+    for draw, (p_lists, owners) in ((vec.circle_spans, conics['circle']), (vec.ellipse_spans, conics['ellipse'])):
+        if p_lists:
+            spans, counts = draw(p_lists, return_counts=True)
+            span_list.append(np.column_stack((spans, np.repeat(owners, counts))))
+    spans = np.concatenate(span_list)
+    if not pixel_list:
+        return np.empty((0, 2), np.int32), np.empty(0, np.int64), spans, culled
+    return np.concatenate(pixel_list), np.concatenate(owner_list), spans, culled
+
+
+def rasterize_fills(items, width, height):
+    """按扫描线填充带填充规则的多边形，返回裁剪到画布内的水平区间
+
+    :param items: (list of [item_type, p_list, algorithm, color, fill]) 按绘制顺序排列的图元
+    :param width, height: (int) 画布大小
+    :return: (list of (int, np.ndarray of int32: (K, 3))) 各填充多边形在items中的序号及其区间[y, x_start, x_end]
+    """
+    fills = []
+    for order, (item_type, p_list, algorithm, color, fill) in enumerate(items):
+        if item_type != 'polygon' or fill is None or len(p_list) == 0:
+            continue
+        if outside_window(p_list, [0, 0, width - 1, height - 1], 0):
+            continue
+        spans = np.asarray(alg.fill_polygon(p_list, fill), np.int32).reshape(-1, 3)
+        spans = clip_spans(spans, 0, 0, width, height)
+        if len(spans):
+            fills.append((order, spans))
+    return fills
+
+
+def clip_spans(spans, x0, y0, x1, y1, translate=True):
+    """将水平区间裁剪到[x0, x1) x [y0, y1)内，并平移到以(x0, y0)为原点
+
+    :param spans: (np.ndarray of int: (K, 3)或(K, 4)) 区间[y, x_start, x_end, ...]，x_start <= x_end，其余列原样保留
+    :param translate: (bool) 是否平移，False时保持原坐标
+    :return: (np.ndarray of int: (K', 3)或(K', 4)) 裁剪后非空的区间
+    """
+    spans = spans[(spans[:, 0] >= y0) & (spans[:, 0] < y1) & (spans[:, 2] >= x0) & (spans[:, 1] < x1)]
+    clipped = spans.copy()
+    clipped[:, 1] = np.maximum(spans[:, 1], x0)
+    clipped[:, 2] = np.minimum(spans[:, 2], x1 - 1)
+    if translate:
+        clipped[:, :3] -= [y0, x0, x0]
+    return clipped
+
+
+# 合成时长度不小于该值的水平区间按切片整段写入，更短的展开为像素后一次写入（一次切片赋值的开销约合几十个像素的下标赋值）
+MIN_SPAN_PIXELS = 64
+
+
+def composite(canvas, pixels, owners, spans, colors, fills=(), mask=None):
+    """将像素、水平区间与填充区间一次性写入画布，重叠处取绘制顺序靠后（序号大）的图元颜色，同一图元的轮廓盖住填充
+
+    短区间展开为像素，与曲线像素一起按像素取最上层后一次写入；长区间按绘制顺序整段写入，
+    被绘制顺序更靠后的长区间盖住的像素不再写入，工作量与长区间的长度无关
+    :param canvas: (np.ndarray of uint8: (H, W, 3)) 画布
+    :param pixels: (np.ndarray of int: (N, 2)) 画布内的像素坐标
+    :param owners: (np.ndarray of int: (N,)) 每个像素所属图元的绘制序号
+    :param spans: (np.ndarray of int: (K, 4)) 画布内的区间[y, x_start, x_end, 所属图元的绘制序号]
+    :param colors: (array-like of uint8: (M, 3)) 按绘制序号排列的图元颜色
+    :param fills: (list of (int, np.ndarray of int: (K, 3))) 按绘制序号排列的填充区间，见rasterize_fills
+    :param mask: (np.ndarray of bool: (H, W)) 只写入掩码为True的像素，None表示全部写入
+    """
+    colors = np.asarray(colors, np.uint8).reshape(-1, 3)
+    # 绘制层次：图元i的填充为2i，轮廓为2i + 1，层次高的盖住层次低的
+    spans = np.array(spans, np.int64).reshape(-1, 4)
+    spans[:, 3] = 2 * spans[:, 3] + 1
+    if fills:
+        spans = np.concatenate([spans] + [np.column_stack((fill, np.full(len(fill), 2 * order))) for order, fill in fills])
+    # 像素与短区间展开的像素都用一维下标 y·W + x 表示
+    width = canvas.shape[1]
+    pixels = np.asarray(pixels, np.int64).reshape(-1, 2)
+    short = spans[:, 2] - spans[:, 1] + 1 < MIN_SPAN_PIXELS
+    short_index, short_layer = _span_indices(spans[short], width)
+    index = np.concatenate((pixels[:, 1] * width + pixels[:, 0], short_index))
+    layer = np.concatenate((2 * np.asarray(owners, np.int64) + 1, short_layer))
+    if mask is not None:
+        keep = mask.ravel()[index]
+        index, layer = index[keep], layer[keep]
+    spans = spans[~short]
+    spans = spans[np.argsort(spans[:, 3], kind='stable')]
+    for y, x_start, x_end, span_layer in spans.tolist():
+        if mask is None:
+            canvas[y, x_start: x_end + 1] = colors[span_layer >> 1]
+        else:
+            canvas[y, x_start: x_end + 1][mask[y, x_start: x_end + 1]] = colors[span_layer >> 1]
+    _composite_pixels(canvas, index, layer, colors, spans)
+
+
+def _span_indices(spans, width):
+    """将区间展开为像素的一维下标 y·width + x，并给出每个像素所属区间的层次
+
+    :param spans: (np.ndarray of int64: (K, 4)) 区间[y, x_start, x_end, 层次]
+    :return: (np.ndarray of int64: (N,), np.ndarray of int64: (N,)) 像素下标与层次
+    """
+    lengths = spans[:, 2] - spans[:, 1] + 1
+    starts = np.cumsum(lengths) - lengths
+    index = np.repeat(spans[:, 0] * width + spans[:, 1] - starts, lengths) + np.arange(lengths.sum())
+    return index, np.repeat(spans[:, 3], lengths)
+
+
+def expand_short_spans(pixels, owners, spans):
+    """将短于MIN_SPAN_PIXELS的区间展开为像素，并入像素数组
+
+    :param pixels: (np.ndarray of int: (N, 2)) 像素坐标
+    :param owners: (np.ndarray of int: (N,)) 每个像素所属图元的序号
+    :param spans: (np.ndarray of int: (K, 4)) 区间[y, x_start, x_end, 所属图元的序号]
+    :return: (np.ndarray of int: (N', 2), np.ndarray of int: (N',), np.ndarray of int: (K', 4)) 合并后的像素及其所属图元，和余下的长区间
+    """
+    short = spans[:, 2] - spans[:, 1] + 1 < MIN_SPAN_PIXELS
+    selected = spans if short.all() else spans[short]
+    span_pixels, index = vec.span_pixels(selected)
+    pixels = np.concatenate((np.asarray(pixels).reshape(-1, 2), span_pixels))
+    owners = np.concatenate((owners, selected[index, 3]))
+    return pixels, owners, spans[~short]
+
+
+def _composite_pixels(canvas, index, layer, colors, spans):
+    """将像素一次性写入画布：重叠像素取层次高的，已整段写入的长区间层次更高时保留区间的颜色
+
+    :param index: (np.ndarray of int64: (N,)) 像素的一维下标 y·W + x
+    :param layer: (np.ndarray of int64: (N,)) 每个像素的绘制层次，见composite
+    :param spans: (np.ndarray of int: (K, 4)) 已写入画布的长区间[y, x_start, x_end, 层次]
+    """
+    if len(index) == 0:
+        return
+    width = canvas.shape[1]
+    # 下标与层次拼成一个键排序，同一像素的各层次相邻且层次高的在后
+    bits = int(layer.max()).bit_length()
+    key = np.sort((index << bits) | layer)
+    index, layer = key >> bits, key & ((1 << bits) - 1)
+    last = np.append(index[1:] != index[:-1], True)
+    index, layer = index[last], layer[last]
+    if len(spans):
+        # 每个长区间在排好序的像素中对应一段连续的下标，逐段比较层次
+        low = np.searchsorted(index, spans[:, 0] * width + spans[:, 1])
+        high = np.searchsorted(index, spans[:, 0] * width + spans[:, 2], 'right')
+        counts = high - low
+        covered = np.repeat(np.arange(len(spans)), counts)
+        covered_pixels = np.arange(counts.sum()) + np.repeat(low - (np.cumsum(counts) - counts), counts)
+        hidden = np.zeros(len(index), bool)
+        hidden[covered_pixels[layer[covered_pixels] < spans[covered, 3]]] = True
+        index, layer = index[~hidden], layer[~hidden]
+    y, x = np.divmod(index, width)
+    # 画布可能是更大画布的一个分块视图（不连续），故按(y, x)下标写入
+    canvas[y, x] = colors[layer >> 1]
+
+
+def _mark_spans(mask, spans):
+    """将区间覆盖的像素在掩码中置为True：短区间展开为像素一次写入，长区间按切片写入
+
+    :param spans: (np.ndarray of int: (K, 3)) 以掩码左上角为原点的区间[y, x_start, x_end]
+    """
+    short = spans[:, 2] - spans[:, 1] + 1 < MIN_SPAN_PIXELS
+    pixels, _ = vec.span_pixels(spans[short])
+    mask[pixels[:, 1], pixels[:, 0]] = True
+    for y, x_start, x_end in spans[~short, :3].tolist():
+        mask[y, x_start: x_end + 1] = True
+
+
+def draw_items(canvas, items, adaptive_curves=False):
+    """按绘制顺序光栅化全部图元并一次性写入画布
+
+    :param canvas: (np.ndarray of uint8: (H, W, 3)) 画布
+    :param items: (iterable of [item_type, p_list, algorithm, color, fill]) 按绘制顺序排列的图元
+    :param adaptive_curves: (bool) 曲线是否采用自适应细分
+    """
+    items = list(items)
+    height, width = canvas.shape[:2]
+    pixels, owners, spans = rasterize_items(items, width, height, adaptive_curves)
+    fills = rasterize_fills(items, width, height)
+    composite(canvas, pixels, owners, spans, [item[3] for item in items], fills)
+
+
+class IncrementalCanvas:
+    """
+    持久画布，缓存每个图元上次绘制的像素；saveCanvas时只擦除脏图元的旧像素，
+    并按绘制顺序重绘受影响区域内的图元，重叠关系与整幅重绘一致
+    """
+
+    def __init__(self, width, height, adaptive_curves=False, canvas=None, profiler=NULL_PROFILER):
+        """
+        :param canvas: (np.ndarray of uint8: (height, width, 3)) 已填充为白色的画布缓冲区，None表示新建
+        :param profiler: (cg_profile.Profiler) 记录各阶段耗时与每个图元的像素数
+        """
+        self.width = width
+        self.height = height
+        self.adaptive_curves = adaptive_curves
+        self.profiler = profiler
+        if canvas is None:
+            canvas = np.full([height, width, 3], 255, np.uint8)    # fill canvas with white
+        self.canvas = canvas
+        # item_id ---> (像素, 长区间, 填充区间 or None, [x_min, y_min, x_max, y_max] or None)；
+        # 轮廓中的短区间与逐个写像素的开销相当，展开为像素缓存，长区间按区间缓存
+        self.cache = {}
+        self.dirty = set()
+
+    def mark_dirty(self, item_id):
+        self.dirty.add(item_id)
+
+    def close(self):
+        pass
+
+    def update(self, item_dict):
+        """重绘脏图元，返回最新的画布"""
+        if not self.dirty:
+            return self.canvas
+        changed, changed_spans = [], []     # 脏图元的旧像素与新像素、旧区间与新区间（轮廓与填充）
+        for item_id in self.dirty:
+            pixels, spans, fill, _ = self.cache.pop(item_id, (None, None, None, None))
+            if pixels is not None:
+                changed.append(pixels)
+                changed_spans.append(spans)
+            if fill is not None:
+                changed_spans.append(fill)
+        dirty_ids = [item_id for item_id in item_dict if item_id in self.dirty]
+        self.dirty.clear()
+        dirty_items = [item_dict[item_id] for item_id in dirty_ids]
+        pixels, owners, spans = rasterize_items(dirty_items, self.width, self.height, self.adaptive_curves,
+                                                profiler=self.profiler)
+        with self.profiler.phase('rasterize'):
+            fills = dict(rasterize_fills(dirty_items, self.width, self.height))
+        pixels, owners, spans = expand_short_spans(pixels, owners, spans)
+        changed.append(pixels)
+        changed_spans.append(spans[:, :3])
+        order = np.argsort(owners, kind='stable')
+        pieces = np.split(pixels[order], np.cumsum(np.bincount(owners, minlength=len(dirty_ids)))[:-1])
+        order = np.argsort(spans[:, 3], kind='stable')
+        span_pieces = np.split(spans[order, :3], np.cumsum(np.bincount(spans[:, 3], minlength=len(dirty_ids)))[:-1])
+        for i, (item_id, item_pixels, item_spans) in enumerate(zip(dirty_ids, pieces, span_pieces)):
+            fill = fills.get(i)
+            corners = [item_pixels, item_spans[:, [1, 0]], item_spans[:, [2, 0]]]
+            if fill is not None:
+                changed_spans.append(fill)
+                corners += [fill[:, [1, 0]], fill[:, [2, 0]]]
+            corners = np.concatenate(corners)
+            box = None
+            if len(corners):
+                box = [*corners.min(axis=0), *corners.max(axis=0)]
+            self.cache[item_id] = (item_pixels, item_spans, fill, box)
+            drawn = len(item_pixels) + int((item_spans[:, 2] - item_spans[:, 1] + 1).sum())
+            if fill is not None:
+                drawn += int((fill[:, 2] - fill[:, 1] + 1).sum())
+            self.profiler.item_pixels(item_id, item_dict[item_id][0], drawn)
+
+        with self.profiler.phase('composite'):
+            self._repaint(item_dict, np.concatenate(changed), changed_spans)
+        return self.canvas
+
+    def _repaint(self, item_dict, changed, changed_spans=()):
+        """擦除变化像素与变化区间，并按绘制顺序重绘落在其上的图元"""
+        corners = [changed] + [spans[:, [1, 0]] for spans in changed_spans] + [spans[:, [2, 0]] for spans in changed_spans]
+        corners = np.concatenate(corners)
+        if len(corners) == 0:
+            return
+        x_min, y_min = corners.min(axis=0)
+        x_max, y_max = corners.max(axis=0)
+        # 受损掩码只覆盖变化像素的包围盒，大画布上也不必分配整幅掩码
+        damaged = np.zeros([y_max - y_min + 1, x_max - x_min + 1], bool)
+        damaged[changed[:, 1] - y_min, changed[:, 0] - x_min] = True
+        for spans in changed_spans:
+            _mark_spans(damaged, spans - [y_min, x_min, x_min])
+        region = self.canvas[y_min: y_max + 1, x_min: x_max + 1]
+        region[damaged] = 255
+        colors, fills = [], []
+        pixel_list, pixel_owners, span_list, span_owners = [], [], [], []
+        for order, (item_id, item) in enumerate(item_dict.items()):
+            colors.append(item[3])
+            item_pixels, item_spans, fill, box = self.cache[item_id]
+            if box is None or box[0] > x_max or box[2] < x_min or box[1] > y_max or box[3] < y_min:
+                continue
+            pixel_list.append(item_pixels)
+            pixel_owners.append((order, len(item_pixels)))
+            span_list.append(item_spans)
+            span_owners.append((order, len(item_spans)))
+            if fill is not None:
+                local_spans = clip_spans(fill, x_min, y_min, x_max + 1, y_max + 1)
+                if len(local_spans):
+                    fills.append((order, local_spans))
+        if not pixel_list:
+            return
+        # 与受损区域相交的图元的像素与区间合在一起，一次平移并剔除、裁剪到区域内
+        pixels = np.concatenate(pixel_list) - [x_min, y_min]
+        owners = np.repeat(*np.array(pixel_owners).reshape(-1, 2).T)
+        inside = (pixels[:, 0] >= 0) & (pixels[:, 0] < damaged.shape[1]) & (pixels[:, 1] >= 0) & (pixels[:, 1] < damaged.shape[0])
+        spans = np.column_stack((np.concatenate(span_list), np.repeat(*np.array(span_owners).reshape(-1, 2).T)))
+        spans = clip_spans(spans, x_min, y_min, x_max + 1, y_max + 1)
+        composite(region, pixels[inside], owners[inside], spans, colors, fills, damaged)
+
+
+class MemmapCanvas(IncrementalCanvas):
+    """
+    画布直接映射到输出目录中的临时BMP文件，光栅化结果直接写入文件映射；
+    saveCanvas时由操作系统复制该文件，内存中不再保留整幅画布或其副本
+    """
+
+    def __init__(self, width, height, output_dir, adaptive_curves=False, profiler=NULL_PROFILER):
+        fd, self.path = tempfile.mkstemp(prefix='.canvas_', suffix='.bmp', dir=output_dir)
+        os.close(fd)
+        self.mm, canvas = cg_io.bmp_memmap(self.path, width, height)
+        canvas.fill(255)
+        super().__init__(width, height, adaptive_curves, canvas, profiler)
+
+    def export(self, path):
+        with self.profiler.phase('export'):
+            self.mm.flush()
+            shutil.copyfile(self.path, path)
+
+    def close(self):
+        del self.canvas, self.mm
+        os.remove(self.path)
+
+
+def item_boxes(items):
+    """图元控制点的包围盒（外扩1像素），曲线在控制多边形的凸包内，故也是像素的包围盒
+
+    :return: (np.ndarray of int: (M, 4)) 每个图元的[x_min, y_min, x_max, y_max]，无控制点的图元为空盒
+    """
+    boxes = np.tile([1, 1, 0, 0], (len(items), 1))
+    for i, item in enumerate(items):
+        if len(item[1]) > 0:
+            points = np.asarray(item[1]).reshape(-1, 2)
+            boxes[i] = [*(points.min(axis=0) - 1), *(points.max(axis=0) + 1)]
+    return boxes
+
+
+def _render_tile(shm_name, shape, tile, items, fills, adaptive_curves):
+    """工作进程：光栅化与分块相交的图元，按绘制顺序写入共享画布中属于该分块的部分
+
+    :param tile: (list of int) 分块范围[x0, y0, x1, y1)
+    :param items: (list of [item_type, p_list, algorithm, color, fill]) 与分块相交的图元，保持绘制顺序
+    :param fills: (list of (int, np.ndarray of int: (K, 3))) 主进程已求出并裁剪到分块内的填充区间（以分块左上角为原点），
+                  序号为图元在items中的序号
+    """
+    x0, y0, x1, y1 = tile
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        canvas = np.ndarray(shape, np.uint8, buffer=shm.buf)
+        pixels, owners, spans = rasterize_items(items, shape[1], shape[0], adaptive_curves,
+                                                window=[x0, y0, x1 - 1, y1 - 1])
+        composite(canvas[y0: y1, x0: x1], pixels - [x0, y0], owners, spans - [y0, x0, x0, 0],
+                  [item[3] for item in items], fills)
+        del canvas
+    finally:
+        shm.close()
+
+
+class TiledCanvas:
+    """
+    分块并行画布：画布位于共享内存中并划分为tile_size见方的分块，图元按包围盒分到各分块，
+    各工作进程独立光栅化并写入自己的分块（分块互不重叠，无需加锁），结果与串行绘制相同
+    """
+
+    def __init__(self, width, height, pool, tile_size=512, adaptive_curves=False, profiler=NULL_PROFILER):
+        self.width = width
+        self.height = height
+        self.pool = pool
+        self.profiler = profiler
+        self.tile_size = tile_size
+        self.adaptive_curves = adaptive_curves
+        self.shm = shared_memory.SharedMemory(create=True, size=max(width * height * 3, 1))
+        self.canvas = np.ndarray([height, width, 3], np.uint8, buffer=self.shm.buf)
+        self.canvas.fill(255)
+        self.dirty = False
+
+    def mark_dirty(self, item_id):
+        self.dirty = True
+
+    def update(self, item_dict):
+        """有图元变化时整幅重绘，返回最新的画布"""
+        if not self.dirty:
+            return self.canvas
+        self.dirty = False
+        with self.profiler.phase('render_tiles'):     # 光栅化在工作进程中进行，只能统计总耗时
+            self._render(item_dict)
+        return self.canvas
+
+    def _render(self, item_dict):
+        self.canvas.fill(255)
+        items = list(item_dict.values())
+        boxes = item_boxes(items)
+        # 填充只在主进程中整幅求一次，各分块只接收裁剪到自己范围内的区间，扫描线填充的工作量不随分块数增长
+        fills = dict(rasterize_fills(items, self.width, self.height))
+        futures = []
+        for y0 in range(0, self.height, self.tile_size):
+            for x0 in range(0, self.width, self.tile_size):
+                x1, y1 = min(x0 + self.tile_size, self.width), min(y0 + self.tile_size, self.height)
+                hit = np.nonzero((boxes[:, 0] < x1) & (boxes[:, 2] >= x0) & (boxes[:, 1] < y1) & (boxes[:, 3] >= y0))[0]
+                if len(hit) == 0:
+                    continue
+                tile_fills = []
+                for order, i in enumerate(hit.tolist()):
+                    if i in fills:
+                        spans = clip_spans(fills[i], x0, y0, x1, y1)
+                        if len(spans):
+                            tile_fills.append((order, spans))
+                futures.append(self.pool.submit(_render_tile, self.shm.name, self.canvas.shape, [x0, y0, x1, y1],
+                                                [items[i] for i in hit], tile_fills, self.adaptive_curves))
+        for future in futures:
+            future.result()
+
+    def close(self):
+        del self.canvas
+        self.shm.close()
+        self.shm.unlink()
+
+
+def compose_transform(transform_dict, item_id, matrix, center=(0, 0)):
+    """将一次变换指令复合到图元的待施加矩阵上（左乘，按指令顺序累积）
+
+    待施加的变换记为 (矩阵, 第一条指令的变换中心)；之后的指令先平移到自己的中心再左乘，只有一条指令时与cg_algorithms逐位相同
+    :param center: (tuple of int) 本条指令的变换中心，见vec.rotate_matrix
+    """
+    pending = transform_dict.get(item_id)
+    if pending is None:
+        transform_dict[item_id] = (matrix, center)
+    else:
+        composed, first_center = pending
+        transform_dict[item_id] = (matrix @ vec.translate_matrix(-center[0], -center[1]) @ composed, first_center)
+
+
+def flush_transforms(item_dict, transform_dict, canvas, item_ids=None):
+    """将待施加的复合变换矩阵一次性作用到图元的全部控制点上，只取整一次
+
+    :param item_ids: (iterable of string) 需要施加变换的图元，None表示全部
+    """
+    for item_id in list(transform_dict if item_ids is None else item_ids):
+        pending = transform_dict.pop(item_id, None)
+        if pending is not None:
+            matrix, center = pending
+            item_dict[item_id][1] = vec.apply_matrix(item_dict[item_id][1], matrix, center)
+            canvas.mark_dirty(item_id)
+
+
+def flush_clips(item_dict, clip_queue, canvas):
+    """执行排队的裁剪指令：同一窗口的Liang-Barsky裁剪经vec.clip_lines一次批量完成，其余逐条裁剪
+
+    不同图元的裁剪互不影响，故排队期间的先后顺序无关紧要；同一图元至多排队一次
+    :param clip_queue: (dict) item_id ---> (x_min, y_min, x_max, y_max, algorithm)，执行后清空
+    """
+    batches = {}                # 裁剪窗口 ---> [item_id]
+    for item_id, (x_min, y_min, x_max, y_max, algorithm) in clip_queue.items():
+        p_list = item_dict[item_id][1]
+        if len(p_list) == 0:
+            continue
+        if algorithm == 'Liang-Barsky' and item_dict[item_id][0] == 'line':
+            batches.setdefault((x_min, y_min, x_max, y_max), []).append(item_id)
+        else:
+            item_dict[item_id][1] = alg.clip(p_list, x_min, y_min, x_max, y_max, algorithm)
+        canvas.mark_dirty(item_id)
+    for window, item_ids in batches.items():
+        segments, visible = vec.clip_lines([item_dict[item_id][1] for item_id in item_ids], *window)
+        for item_id, segment, keep in zip(item_ids, segments.tolist(), visible):
+            item_dict[item_id][1] = [segment[:2], segment[2:]] if keep else []
+    clip_queue.clear()
+
+
+class BackgroundWriter:
+    """
+    后台保存画布：saveCanvas把画布快照交给线程池编码写盘，指令解析与光栅化不必等待磁盘I/O；
+    待写快照数不超过max_pending（背压，限制内存），close时等待全部写完并汇总错误
+    """
+
+    def __init__(self, workers=2, max_pending=4, compress_level=6, profiler=NULL_PROFILER):
+        self.compress_level = compress_level
+        self.profiler = profiler
+        self.pool = ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self.lock = threading.Lock()
+        self.errors = []            # [(path, exception)]
+
+    def save(self, canvas, path, fmt='bmp'):
+        if self.pool is None:       # 同步保存
+            self._write(canvas, path, fmt)
+            return
+        with self.profiler.phase('backpressure'):
+            self.slots.acquire()    # 待写快照已满时阻塞，直到有快照写完
+        with self.profiler.phase('snapshot'):
+            snapshot = canvas.copy()    # 之后画布会被继续修改，只能交出快照
+        try:
+            self.pool.submit(self._write, snapshot, path, fmt).add_done_callback(lambda _: self.slots.release())
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def _write(self, canvas, path, fmt):
+        start = time.perf_counter()
+        try:
+            with self.profiler.phase('encode'):
+                cg_io.save_image(canvas, path, fmt, self.compress_level)
+            self.profiler.encoded(path, time.perf_counter() - start)
+        except Exception as e:
+            with self.lock:
+                self.errors.append((path, e))
+
+    def close(self):
+        """等待全部快照写完，返回写入失败的[(path, exception)]"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+        return self.errors
+
+
+def run_script(input_file, output_dir, adaptive_curves=False, save_workers=2, max_pending_saves=4,
+               tile_size=None, render_workers=None, memmap=False, fmt='bmp', compress_level=6, profiler=NULL_PROFILER):
+    """执行一个指令文件，saveCanvas的结果保存到output_dir
+
+    :param input_file: (string) 指令文件路径
+    :param output_dir: (string) 输出目录
+    :param adaptive_curves: (bool) 曲线是否采用自适应细分
+    :param save_workers: (int) 后台编码写盘的线程数，0表示在指令循环中同步保存
+    :param max_pending_saves: (int) 最多同时等待写盘的画布快照数
+    :param tile_size: (int) 不为None时使用分块并行画布，分块边长为tile_size
+    :param render_workers: (int) 分块并行光栅化的进程数，None表示CPU核数
+    :param memmap: (bool) 画布直接映射到BMP文件（适用于超出内存的画布），不能与分块并行同时使用
+    :param fmt: (string) 默认输出格式，见cg_io.FORMATS；saveCanvas可单独指定
+    :param compress_level: (int) PNG压缩等级，0~9
+    :param profiler: (cg_profile.Profiler) 记录各指令与各阶段的耗时，见cg_profile
+    """
+    if memmap and tile_size is not None:
+        raise ValueError('memmap canvas cannot be combined with tiled rendering')
     os.makedirs(output_dir, exist_ok=True)
+    if fmt not in cg_io.FORMATS:
+        raise ValueError(f'Unknown output format: {fmt}')
+    if profiler.enabled:
+        profiler.start()
+    writer = BackgroundWriter(save_workers, max_pending_saves, compress_level, profiler)
+    pool = ProcessPoolExecutor(max_workers=render_workers) if tile_size is not None else None
+    canvases = []
+
+    def new_canvas(width, height):
+        if canvases:                # resetCanvas时释放上一块画布
+            canvases.pop().close()
+        if memmap:
+            canvases.append(MemmapCanvas(width, height, output_dir, adaptive_curves, profiler))
+        elif pool is None:
+            canvases.append(IncrementalCanvas(width, height, adaptive_curves, profiler=profiler))
+        else:
+            canvases.append(TiledCanvas(width, height, pool, tile_size, adaptive_curves, profiler))
+        return canvases[-1]
+
+    try:
+        _run_commands(input_file, output_dir, new_canvas, writer, fmt, profiler)
+    finally:
+        errors = writer.close()     # 退出前保证全部保存完成
+        for canvas in canvases:
+            canvas.close()
+        if pool is not None:
+            pool.shutdown()
+        if profiler.enabled:
+            profiler.stop()
+    if errors:
+        for path, e in errors:
+            print(f'saveCanvas failed: {path}: {e}', file=sys.stderr)
+        raise IOError(f'{len(errors)} saveCanvas failed, first: {errors[0][0]}') from errors[0][1]
+
+
+def _run_commands(input_file, output_dir, new_canvas, writer, default_format='bmp', profiler=NULL_PROFILER):
+    """逐行解析并执行指令，saveCanvas交给writer保存
 
+    :param new_canvas: (callable) new_canvas(width, height)创建画布
+    :param default_format: (string) saveCanvas未指定格式时的输出格式
+    :param profiler: (cg_profile.Profiler) 记录各指令的耗时
+    """
     item_dict = {}
     transform_dict = {}
+    clip_queue = {}                     # 尚未执行的裁剪指令，连续的裁剪指令攒在一起批量执行
     pen_color = np.zeros(3, np.uint8)   # paintbrush, [R, G, B], 0-255
     width = 0
     height = 0
+    canvas = new_canvas(width, height)
 
     with open(input_file, 'r') as fp:
         line = fp.readline()
         while line:
-            line = line.strip().split(' ')
-            if line[0] == 'resetCanvas':
-                width = int(line[1])
-                height = int(line[2])
-                item_dict = {}
-                transform_dict = {}
-            elif line[0] == 'saveCanvas':
-                save_name = line[1]
-                canvas = np.zeros([height, width, 3], np.uint8)
-                canvas.fill(255)        # fill canvas with white
-                    
-                for item_id, (transform_type, transform_params) in transform_dict.items():
-                    p_list = item_dict[item_id][1]                  # transform_params ---> [x, y, ..., algorithm]
-                    if transform_type == 'translate':
-                        dx, dy = transform_params
-                        p_list_t = alg.translate(p_list, dx, dy)
-                    elif transform_type == 'rotate':
-                        x, y, r = transform_params
-                        p_list_t = alg.rotate(p_list, x, y, r)
-                    elif transform_type == 'scale':
-                        x, y, s = transform_params
-                        p_list_t = alg.scale(p_list, x, y, s)
-                    elif transform_type == 'clip':
-                        x0, y0, x1, y1, algorithm = transform_params
-                        p_list_t = alg.clip(p_list, x0, y0, x1, y1, algorithm)
-                    item_dict[item_id][1] = p_list_t       # transform item
-
-                for item_type, p_list, algorithm, color in item_dict.values():
-                    if item_type == 'line':
-                        pixels = alg.draw_line(p_list, algorithm)
-                    elif item_type == 'polygon':
-                        pixels = alg.draw_polygon(p_list, algorithm)
-                    elif item_type == 'circle':
-                        pixels = alg.draw_circle(p_list)
-                    elif item_type == 'ellipse':
-                        pixels = alg.draw_ellipse(p_list)
-                    elif item_type == 'curve':
-                        pixels = alg.draw_curve(p_list, algorithm)
-                    # modified
-                    for x, y in pixels:
-                        if x < 0 or x >= width or y < 0 or y >= height:     # for debug
-                            print(x, y)
-                            print('Beyond the canvas!') 
-                        else:
-                            canvas[y, x] = color
-
-                Image.fromarray(canvas).save(os.path.join(output_dir, save_name + '.bmp'), 'bmp')
-
-            elif line[0] == 'setColor':
-                pen_color[0] = int(line[1])
-                pen_color[1] = int(line[2])
-                pen_color[2] = int(line[3])
-            elif line[0] == 'drawLine':
-                assert len(line) == 7, 'drawLine: Seven arguments are expected!'
-                item_id = line[1]
-                x0, y0, x1, y1 = map(int, line[2: 6])
-                algorithm = line[6]
-                item_dict[item_id] = ['line', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color)]
-            elif line[0] == 'drawPolygon':
-                item_id = line[1]
-                p_list = [[int(x), int(y)] for x, y in zip(line[2: -2: 2], line[3: -1: 2])]
-                algorithm = line[-1]
-                item_dict[item_id] = ['polygon', p_list, algorithm, np.array(pen_color)]
-            elif line[0] == 'drawCircle':
-                assert len(line) == 6, 'drawCircle: Six arguments are expected!'
-                item_id = line[1]
-                x0, y0, x1, y1 = map(int, line[2: 6])
-                algorithm = 'Bresenham'
-                item_dict[item_id] = ['circle', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color)]
-            elif line[0] == 'drawEllipse':
-                assert len(line) == 6, 'drawEllipse: Six arguments are expected!'
-                item_id = line[1]
-                x0, y0, x1, y1 = map(int, line[2: 6])
-                algorithm = 'midpoint'
-                item_dict[item_id] = ['ellipse', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color)]
-            elif line[0] == 'drawCurve':
-                item_id = line[1]
-                p_list = [[int(x), int(y)] for x, y in zip(line[2: -2: 2], line[3: -1: 2])]
-                algorithm = line[-1]
-                item_dict[item_id] = ['curve', p_list, algorithm, np.array(pen_color)]
-            elif line[0] == 'translate':
-                assert len(line) == 4, 'translate: Four arguments are expected!'
-                item_id = line[1]
-                dx, dy = map(int, line[2: ])
-                transform_dict[item_id] = ['translate', [dx, dy]]
-            elif line[0] == 'rotate':
-                assert len(line) == 5, 'rotate: Five arguments are expected!'
-                item_id = line[1]
-                x, y, r = map(int, line[2: ])
-                transform_dict[item_id] = ['rotate', [x, y, r]]
-            elif line[0] == 'scale':
-                assert len(line) == 5, 'scale: Five arguments are expected!'
-                item_id = line[1]
-                x, y, s = int(line[2]), int(line[3]), float(line[4])
-                transform_dict[item_id] = ['scale', [x, y, s]]
-            elif line[0] == 'clip':
-                assert len(line) == 7, 'clip: Seven arguments are expected!'
-                item_id = line[1]
-                x0, y0, x1, y1 = map(int, line[2: 6])
-                x_min, y_min, x_max, y_max = min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
-                algorithm = line[6]
-                transform_dict[item_id] = ['clip', [x_min, y_min, x_max, y_max, algorithm]]
-
-            ...
+            with profiler.phase('parse'):
+                line = line.strip().split(' ')
+            if clip_queue and line[0] != 'clip':
+                with profiler.phase('clip'):
+                    flush_clips(item_dict, clip_queue, canvas)
+            with profiler.command(line[0]):
+                if line[0] == 'resetCanvas':
+                    width = int(line[1])
+                    height = int(line[2])
+                    item_dict = {}
+                    transform_dict = {}
+                    canvas = new_canvas(width, height)
+                    profiler.reset_canvas()
+                elif line[0] == 'saveCanvas':
+                    save_name = line[1]
+                    save_format = line[2] if len(line) > 2 else default_format     # saveCanvas name [bmp|png|npy|raw]
+                    assert save_format in cg_io.FORMATS, f'saveCanvas: Unknown format {save_format}!'
+                    save_start = time.perf_counter()
+                    with profiler.phase('transform'):
+                        flush_transforms(item_dict, transform_dict, canvas)
+                    image = canvas.update(item_dict)
+                    save_path = os.path.join(output_dir, save_name + cg_io.FORMATS[save_format])
+                    if isinstance(canvas, MemmapCanvas) and save_format == 'bmp':
+                        canvas.export(save_path)        # 画布本身就是BMP文件，直接复制
+                    else:
+                        writer.save(image, save_path, save_format)
+                    profiler.saved(save_path, save_format, time.perf_counter() - save_start)
+
+                elif line[0] == 'setColor':
+                    pen_color[0] = int(line[1])
+                    pen_color[1] = int(line[2])
+                    pen_color[2] = int(line[3])
+                elif line[0] == 'drawLine':
+                    assert len(line) == 7, 'drawLine: Seven arguments are expected!'
+                    item_id = line[1]
+                    x0, y0, x1, y1 = map(int, line[2: 6])
+                    algorithm = line[6]
+                    item_dict[item_id] = ['line', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color), None]
+                    transform_dict.pop(item_id, None)
+                    canvas.mark_dirty(item_id)
+                elif line[0] == 'drawPolygon':
+                    item_id = line[1]
+                    fill = None                     # drawPolygon id x0 y0 ... algorithm [fill [evenodd|nonzero]]
+                    if len(line) > 2 and line[-2] == 'fill':
+                        fill = line.pop()
+                        assert fill in ['evenodd', 'nonzero'], f'drawPolygon: Unknown fill rule {fill}!'
+                        line.pop()
+                    elif line[-1] == 'fill':
+                        fill = 'evenodd'
+                        line.pop()
+                    p_list = [[int(x), int(y)] for x, y in zip(line[2: -2: 2], line[3: -1: 2])]
+                    algorithm = line[-1]
+                    item_dict[item_id] = ['polygon', p_list, algorithm, np.array(pen_color), fill]
+                    transform_dict.pop(item_id, None)
+                    canvas.mark_dirty(item_id)
+                elif line[0] == 'drawCircle':
+                    assert len(line) == 6, 'drawCircle: Six arguments are expected!'
+                    item_id = line[1]
+                    x0, y0, x1, y1 = map(int, line[2: 6])
+                    algorithm = 'Bresenham'
+                    item_dict[item_id] = ['circle', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color), None]
+                    transform_dict.pop(item_id, None)
+                    canvas.mark_dirty(item_id)
+                elif line[0] == 'drawEllipse':
+                    assert len(line) == 6, 'drawEllipse: Six arguments are expected!'
+                    item_id = line[1]
+                    x0, y0, x1, y1 = map(int, line[2: 6])
+                    algorithm = 'midpoint'
+                    item_dict[item_id] = ['ellipse', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color), None]
+                    transform_dict.pop(item_id, None)
+                    canvas.mark_dirty(item_id)
+                elif line[0] == 'drawCurve':
+                    item_id = line[1]
+                    p_list = [[int(x), int(y)] for x, y in zip(line[2: -2: 2], line[3: -1: 2])]
+                    algorithm = line[-1]
+                    item_dict[item_id] = ['curve', p_list, algorithm, np.array(pen_color), None]
+                    transform_dict.pop(item_id, None)
+                    canvas.mark_dirty(item_id)
+                elif line[0] == 'translate':
+                    assert len(line) == 4, 'translate: Four arguments are expected!'
+                    item_id = line[1]
+                    dx, dy = map(int, line[2: ])
+                    with profiler.phase('transform'):
+                        compose_transform(transform_dict, item_id, vec.translate_matrix(dx, dy))
+                elif line[0] == 'rotate':
+                    assert len(line) == 5, 'rotate: Five arguments are expected!'
+                    item_id = line[1]
+                    x, y, r = map(int, line[2: ])
+                    with profiler.phase('transform'):
+                        compose_transform(transform_dict, item_id, vec.rotate_matrix(x, y, r), (x, y))
+                elif line[0] == 'scale':
+                    assert len(line) == 5, 'scale: Five arguments are expected!'
+                    item_id = line[1]
+                    x, y, s = int(line[2]), int(line[3]), float(line[4])
+                    with profiler.phase('transform'):
+                        compose_transform(transform_dict, item_id, vec.scale_matrix(x, y, s), (x, y))
+                elif line[0] == 'clip':
+                    assert len(line) == 7, 'clip: Seven arguments are expected!'
+                    item_id = line[1]
+                    x0, y0, x1, y1 = map(int, line[2: 6])
+                    x_min, y_min, x_max, y_max = min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+                    algorithm = line[6]
+                    with profiler.phase('transform'):
+                        flush_transforms(item_dict, transform_dict, canvas, [item_id])     # 裁剪不是仿射变换，先施加之前的变换
+                    if item_id in clip_queue:       # 同一图元的再次裁剪须在上一次裁剪之后
+                        with profiler.phase('clip'):
+                            flush_clips(item_dict, clip_queue, canvas)
+                    clip_queue[item_id] = (x_min, y_min, x_max, y_max, algorithm)
+
+                ...
 
             line = fp.readline()
 
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_file')
+    parser.add_argument('output_dir')
+    parser.add_argument('--adaptive-curves', action='store_true', help='曲线按平直度自适应细分后用直线连接')
+    parser.add_argument('--save-workers', type=int, default=2, help='后台编码写盘的线程数，0表示同步保存')
+    parser.add_argument('--max-pending-saves', type=int, default=4, help='最多同时等待写盘的画布快照数')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--tile-size', type=int, default=None, help='使用共享内存分块并行光栅化，指定分块边长（像素）')
+    mode.add_argument('--memmap', action='store_true', help='画布直接映射到BMP文件，适用于超出内存的画布')
+    parser.add_argument('--render-workers', type=int, default=None, help='分块并行光栅化的进程数，默认为CPU核数')
+    parser.add_argument('--format', default='bmp', choices=list(cg_io.FORMATS), help='默认输出格式，saveCanvas可单独指定')
+    parser.add_argument('--compress-level', type=int, default=6, choices=range(10), help='PNG压缩等级，0最快，9最小')
+    parser.add_argument('--profile', metavar='REPORT', help='记录各指令与各阶段的耗时，写入REPORT（.json或.csv）')
+    parser.add_argument('--cprofile-dir', help='与--profile同用，主线程中每个阶段的cProfile数据写入该目录下的<phase>.prof')
+    args = parser.parse_args()
+    if args.cprofile_dir and not args.profile:
+        parser.error('--cprofile-dir requires --profile')
+
+    profiler = Profiler(cprofile=args.cprofile_dir is not None) if args.profile else NULL_PROFILER
+    try:
+        run_script(args.input_file, args.output_dir, args.adaptive_curves, args.save_workers, args.max_pending_saves,
+                   args.tile_size, args.render_workers, args.memmap, args.format, args.compress_level, profiler)
+    finally:
+        if args.profile:        # 脚本出错时也保存已有的统计，便于定位
+            profiler.write(args.profile)
+            if args.cprofile_dir:
+                profiler.dump_cprofile(args.cprofile_dir)
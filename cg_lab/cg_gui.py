@@ -8,6 +8,7 @@ import numpy as np
 from PIL import Image
 import warnings
 import cg_algorithms as alg
+import cg_vectorized as vec
 from typing import Optional
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
@@ -20,8 +21,112 @@ warnings.filterwarnings('ignore')
 CWD = os.getcwd()                   # 获取当前工作目录路径
 FONT = QFont("YouYuan", 12,)        # 字体
 MAX_NUM_CONTROL_POINTS = 6          # 最大控制点个数
+HIT_TOLERANCE = 4                   # 点选图元时允许的最大距离（像素，另加画笔半宽）
+INDEX_CELL_SIZE = 64                # 空间索引的网格边长（像素）
+GRID_DENSITY = 25                   # 背景网格的间距（像素）
+GRID_DASH_PERIOD = 6                # 1像素宽Qt.DashLine的虚线周期（4像素实线 + 2像素空白）
+PREVIEW_TOLERANCE = 4               # 拖动预览时曲线自适应细分的平直度阈值（像素），松开鼠标后恢复完整绘制
 HELP_FILE = 'https://github.com/stu-yue'
 
+
+def to_qpolygon(pixels):
+    """将像素点坐标列表转换为QPolygon，供QPainter.drawPoints一次绘制全部像素
+
+    直接把坐标写入QPolygon的内存（QPoint为两个int），不逐点构造QPoint
+    :param pixels: (list of list of int: [[x_0, y_0], [x_1, y_1], ...]) 像素点坐标列表
+    :return: (QPolygon)
+    """
+    points = np.asarray(pixels, np.int32).reshape(-1, 2)
+    polygon = QPolygon(len(points))
+    if len(points):
+        buffer = polygon.data()
+        buffer.setsize(points.nbytes)
+        np.frombuffer(buffer, np.int32)[:] = points.ravel()
+    return polygon
+
+
+class ItemIndex:
+    """
+    图元的均匀网格空间索引：图元按包围盒（外扩画笔半宽）登记到所覆盖的网格中，点选时只检查点击位置附近网格内的图元。
+    图元改变后只标记为过期，下次查询时才重新登记，拖动图元时不必逐次维护索引
+    """
+
+    def __init__(self, cell_size=INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}             # (i, j) ---> set of MyItem
+        self.item_cells = {}        # MyItem ---> [(i, j)]，已登记的网格
+        self.stale = set()          # 需要重新登记的图元
+
+    def insert(self, item):
+        item.index = self
+        self.item_cells[item] = []
+        self.stale.add(item)
+
+    def remove(self, item):
+        if item not in self.item_cells:
+            return
+        self._unregister(item)
+        del self.item_cells[item]
+        self.stale.discard(item)
+        item.index = None
+
+    def clear(self):
+        for item in self.item_cells:
+            item.index = None
+        self.cells = {}
+        self.item_cells = {}
+        self.stale = set()
+
+    def mark_stale(self, item):
+        self.stale.add(item)
+
+    def _unregister(self, item):
+        for cell in self.item_cells[item]:
+            self.cells[cell].discard(item)
+            if not self.cells[cell]:
+                del self.cells[cell]
+        self.item_cells[item] = []
+
+    def _refresh(self):
+        for item in self.stale:
+            self._unregister(item)
+            bounds = item.bounds()
+            if bounds is None:
+                continue
+            # 包围盒外扩画笔半宽：查询时再外扩tolerance，即覆盖了点选的判定范围tolerance + 画笔半宽
+            x_min, y_min, x_max, y_max = bounds
+            margin = item.width / 2
+            i0, j0 = int((x_min - margin) // self.cell_size), int((y_min - margin) // self.cell_size)
+            i1, j1 = int((x_max + margin) // self.cell_size), int((y_max + margin) // self.cell_size)
+            cells = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+            for cell in cells:
+                self.cells.setdefault(cell, set()).add(item)
+            self.item_cells[item] = cells
+        self.stale.clear()
+
+    def query(self, x, y, tolerance=HIT_TOLERANCE):
+        """距点(x, y)最近的图元，距离须在tolerance加画笔半宽以内；距离相同时选择编号小者
+
+        :return: (MyItem) 选中的图元，没有则为None
+        """
+        self._refresh()
+        candidates = set()
+        i0, j0 = int((x - tolerance) // self.cell_size), int((y - tolerance) // self.cell_size)
+        i1, j1 = int((x + tolerance) // self.cell_size), int((y + tolerance) // self.cell_size)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                candidates |= self.cells.get((i, j), set())
+        best, best_key = None, None
+        for item in candidates:
+            distance = item.distance(x, y)
+            if distance > tolerance + item.width / 2:
+                continue
+            key = (distance, (0, int(item.id)) if item.id.isdigit() else (1, item.id))
+            if best_key is None or key < best_key:
+                best, best_key = item, key
+        return best
+
+
 class MyCanvas(QGraphicsView):
     """
     画布窗体类，继承自QGraphicsView，采用QGraphicsView、QGraphicsScene、QGraphicsItem的绘图框架
@@ -35,6 +140,7 @@ class MyCanvas(QGraphicsView):
 
         self.status = ''
         self.temp_algorithm = ''
+        self.temp_fill = None       # 正在绘制的多边形的填充规则，None表示不填充
         self.color = QColor(0, 0, 0)
         self.pen_width = 2
         self.temp_id = ''
@@ -45,6 +151,13 @@ class MyCanvas(QGraphicsView):
         self.x0, self.y0 = None, None
         self.flags = {'translate': 0, 'rotate': 0, 'scale': 0, 'clip': 0}
         self.copy_item = None
+        self.index = ItemIndex()    # item_dict中图元的空间索引，用于点选
+        # 拖动时只记录最新的鼠标位置，由定时器按屏幕刷新率合并处理
+        self.pending_pos = None
+        self.move_timer = QTimer(self)
+        self.move_timer.setSingleShot(True)
+        self.move_timer.setInterval(self.refresh_interval())
+        self.move_timer.timeout.connect(self.apply_pending_move)
     
     def set_color(self, new_color):
         self.color = new_color
@@ -77,6 +190,7 @@ class MyCanvas(QGraphicsView):
     def clear_canvas(self):
         self.remove_items()
         self.item_dict = {}
+        self.index.clear()
         self.selected_id = ''
         self.status = ''
         self.temp_algorithm = ''
@@ -91,10 +205,11 @@ class MyCanvas(QGraphicsView):
         self.temp_algorithm = algorithm
         self.temp_id = item_id
 
-    def start_draw_polygon(self, algorithm, item_id):
+    def start_draw_polygon(self, algorithm, item_id, fill=None):
         self.temp_isNew = True
         self.status = 'polygon'
         self.temp_algorithm = algorithm
+        self.temp_fill = fill
         self.temp_id = item_id
     
     def start_draw_ellipse(self, algorithm, item_id):
@@ -120,11 +235,11 @@ class MyCanvas(QGraphicsView):
         self.finish_draw()
         self.status = edit_type
         self.temp_algorithm = algorithm
-        self.updateScene([self.sceneRect()])
 
     def clear_selection(self):
         if self.selected_id != '':
             self.item_dict[self.selected_id].selected = False
+            self.item_dict[self.selected_id].update()
             self.selected_id = ''
 
     def selection_changed(self, selected):
@@ -135,15 +250,28 @@ class MyCanvas(QGraphicsView):
         self.item_dict[selected].selected = True
         self.item_dict[selected].update()
         self.status = ''
-        self.updateScene([self.sceneRect()])
-        boundingRect = self.item_dict[selected].boundingRect()
+        boundingRect = self.item_dict[selected].outlineRect()
         self.main_window.statusBar().showMessage(f'图元选择: {selected} [{int(boundingRect.left())}, {int(boundingRect.bottom())}, {int(boundingRect.right())}, {int(boundingRect.top())}]')
     
     def add_item_to_scene_dict(self):
         self.scene().addItem(self.temp_item)
         self.item_dict[self.temp_id] = self.temp_item
+        self.index.insert(self.temp_item)
+
+    def remove_item(self, item_id):
+        """从画布中删除图元"""
+        item = self.item_dict.pop(item_id)
+        self.index.remove(item)
+        self.scene().removeItem(item)
+
+    def refresh_interval(self):
+        """屏幕刷新一帧的时长（毫秒）"""
+        screen = QGuiApplication.primaryScreen()
+        rate = screen.refreshRate() if screen is not None else 0
+        return max(int(1000 / rate), 1) if rate > 0 else 16
 
     def mousePressEvent(self, event: QMouseEvent) -> None:
+        self.apply_pending_move()                       # 先处理尚未处理的拖动，保持事件顺序
         pos = self.mapToScene(event.localPos().toPoint())
         x = int(pos.x())
         y = int(pos.y())
@@ -155,7 +283,7 @@ class MyCanvas(QGraphicsView):
             elif self.status == 'polygon':
                 if self.temp_isNew:
                     self.temp_isNew = False
-                    self.temp_item = MyItem(self, self.temp_id, self.status, [[x, y], [x, y]], self.temp_algorithm, self.color, self.pen_width)
+                    self.temp_item = MyItem(self, self.temp_id, self.status, [[x, y], [x, y]], self.temp_algorithm, self.color, self.pen_width, fill=self.temp_fill)
                     self.add_item_to_scene_dict()
             elif self.status == 'ellipse':
                 self.temp_item = MyItem(self, self.temp_id, self.status, [[x, y], [x, y]], self.temp_algorithm, self.color, self.pen_width)
@@ -167,7 +295,7 @@ class MyCanvas(QGraphicsView):
                     self.add_item_to_scene_dict()
                 else:                                           # 插入控制点
                     insert_pos = len(self.temp_item.p_list) - 1
-                    self.temp_item.p_list.insert(insert_pos, [x, y])
+                    self.temp_item.insert_point(insert_pos, [x, y])
             elif self.status == 'translate' and self.selected_id != '' and self.selected_id in self.item_dict:
                 if not (self.status == 'rotate' and self.item_dict[self.selected_id].item_type == 'ellipse'):
                     self.temp_id = self.selected_id
@@ -198,53 +326,66 @@ class MyCanvas(QGraphicsView):
                 self.copy_item.edit('translate', '', [x - last_pos[0], y - last_pos[1]])
                 self.scene().addItem(self.copy_item)
                 self.item_dict[self.copy_item.id] = self.copy_item
+                self.index.insert(self.copy_item)
                 self.selection_changed(self.copy_item.id)
                 self.status = ''
                 self.copy_item = None
             elif self.status == '':
                 self.clear_selection()
-                for item in self.item_dict.values():            # 遍历图元字典，确定选择对象
-                    if item.contains([x, y]) and self.selected_id == '':
-                        self.selection_changed(item.id)
+                item = self.index.query(x, y)                   # 只检查点击位置附近的图元
+                if item is not None:
+                    self.selection_changed(item.id)
         elif event.button() == Qt.RightButton:
             if self.status in ['polygon', 'curve']:
                 self.finish_draw()
 
-        self.updateScene([self.sceneRect()])
         super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event: QMouseEvent) -> None:
         pos = self.mapToScene(event.localPos().toPoint())
-        x = int(pos.x())
-        y = int(pos.y())
+        self.pending_pos = [int(pos.x()), int(pos.y())]
+        if not self.move_timer.isActive():
+            self.move_timer.start()
+        super().mouseMoveEvent(event)
+
+    def apply_pending_move(self):
+        """按最近一次鼠标位置更新正在绘制或编辑的图元，一帧内的多次移动只处理一次"""
+        self.move_timer.stop()
+        if self.pending_pos is None:
+            return
+        x, y = self.pending_pos
+        self.pending_pos = None
         if self.status == 'line'and self.temp_item != None:
-            self.temp_item.p_list[1] = [x, y]
+            self.temp_item.set_point(1, [x, y])
         elif self.status == 'polygon'and self.temp_item != None:
-            self.temp_item.p_list[-1] = [x, y]
+            self.temp_item.set_point(-1, [x, y])
         elif self.status == 'ellipse'and self.temp_item != None:
-            self.temp_item.p_list[1] = [x, y]
+            self.temp_item.set_point(1, [x, y])
         elif self.status == 'curve' and self.temp_item != None:
             modify_pos = -1 if len(self.temp_item.p_list) == 2 else -2
-            self.temp_item.p_list[modify_pos] = [x, y]
+            self.temp_item.preview = True               # 拖动过程中曲线粗略绘制，完成绘制后恢复
+            self.temp_item.set_point(modify_pos, [x, y])
         elif self.status == 'translate' and self.flags[self.status]:
+            self.temp_item.preview = True
             self.temp_item.edit('translate', '', [x - self.x0, y - self.y0])
             self.x0, self.y0 = x, y
         elif self.status == 'rotate' and self.flags[self.status] == 2:
             rx, ry = self.temp_anchor.center()
             theta = (math.atan2(y - ry, x - rx) - math.atan2(self.y0 - ry, self.x0 - rx)) * 180 / math.pi
+            self.temp_item.preview = True
             self.temp_item.edit('rotate', '', [rx, ry, theta])
         elif self.status == 'scale' and self.flags[self.status] == 2:
             sx, sy = self.temp_anchor.center()
             last_len = math.sqrt((self.x0 - sx) ** 2 + (self.y0 - sy) ** 2)
             now_len = math.sqrt((x - sx) ** 2 + (y - sy) ** 2)
             s = float(now_len / last_len)
+            self.temp_item.preview = True
             self.temp_item.edit('scale', '', [sx, sy, s])
         elif self.status == 'clip' and self.flags[self.status]:
-            self.temp_rect.p_list[1] = [x, y]
-        self.updateScene([self.sceneRect()])
-        super().mouseMoveEvent(event)
+            self.temp_rect.set_point(1, [x, y])
 
     def mouseReleaseEvent(self, event: QMouseEvent) -> None:
+        self.apply_pending_move()
         pos = self.mapToScene(event.localPos().toPoint())
         x = int(pos.x())
         y = int(pos.y()) 
@@ -253,12 +394,13 @@ class MyCanvas(QGraphicsView):
             if self.status in ['line', 'ellipse']:
                 self.finish_draw()
             elif self.status == 'polygon':
-                self.temp_item.p_list.append([x, y])
+                self.temp_item.append_point([x, y])
             elif self.status == 'curve':
                 if len(self.temp_item.p_list) == MAX_NUM_CONTROL_POINTS:
                     self.finish_draw()
             elif self.status == 'translate' and self.flags[self.status] == 1:
                 self.flags[self.status] = 0
+                self.temp_item.preview = False
             elif self.status in ['rotate', 'scale'] and self.flags[self.status] == 2:
                 self.flags[self.status] = 0
                 self.scene().removeItem(self.temp_anchor)
@@ -270,11 +412,10 @@ class MyCanvas(QGraphicsView):
                 self.scene().removeItem(self.temp_rect)
                 p_list = self.temp_item.p_list
                 if not p_list or p_list[0][0] == p_list[1][0] and p_list[0][1] == p_list[1][1]:
-                    self.scene().removeItem(self.temp_item)
+                    self.remove_item(self.temp_id)
                 self.status = ''
                 self.selected_id = ''
                 self.finish_draw()
-        self.updateScene([self.sceneRect()])
         super().mouseReleaseEvent(event)
 
 
@@ -282,9 +423,13 @@ class MyCanvas(QGraphicsView):
 class MyItem(QGraphicsItem):
     """
     自定义图元类，继承自QGraphicsItem
+
+    光栅化结果缓存在图元中，只有p_list、algorithm或isDrawFinished改变时才重新计算；
+    修改控制点须整体赋值p_list或调用set_point/insert_point/append_point，不能直接修改p_list中的元素。
+    图元改变时通知场景重绘其新旧包围矩形，画布无需整幅刷新
     """
 
-    def __init__(self, canvas: QGraphicsView, item_id: str, item_type: str, p_list: list, algorithm: str = '', color: QColor = QColor(0, 0, 0), width: int = 2, parent: QGraphicsItem = None):
+    def __init__(self, canvas: QGraphicsView, item_id: str, item_type: str, p_list: list, algorithm: str = '', color: QColor = QColor(0, 0, 0), width: int = 2, parent: QGraphicsItem = None, fill: str = None):
         """
 
         :param item_id: 图元ID
@@ -292,27 +437,185 @@ class MyItem(QGraphicsItem):
         :param p_list: 图元参数
         :param algorithm: 绘制算法，'DDA'、'Bresenham'、'Bezier'、'B-spline'等
         :param parent:
+        :param fill: 多边形的填充规则，'evenodd'、'nonzero'，None表示不填充
         """
         super().__init__(parent)
+        self.index = None           # 所在的空间索引，图元改变时通知其重新登记
         self.id = item_id           # 图元ID
         self.item_type = item_type  # 图元类型，'line'、'polygon'、'ellipse'、'curve'等
         self.p_list = p_list        # 图元参数
         self.algorithm = algorithm  # 绘制算法，'DDA'、'Bresenham'、'Bezier'、'B-spline'等
+        self.fill = fill            # 多边形的填充规则
         self.color = color
         self.width = width
         self.parent = parent
         self.pen = QPen()
         self.pen.setColor(color)
         self.pen.setWidth(width)
+        self.fill_pen = QPen(color)     # 填充区间用1像素宽的画笔，不会溢出多边形
+        self.fill_pen.setWidth(1)
         self.canvas = canvas
         self.isDrawFinished = False
+        self.preview = False        # 为True时曲线粗略绘制，用于拖动过程中的预览
         self.selected = False
         self.centerPoint = None
 
         self.computeCenter()        # 计算图元中心
-    
+
+    @property
+    def p_list(self):
+        return self._p_list
+
+    @p_list.setter
+    def p_list(self, p_list):
+        self._p_list = p_list
+        self.invalidate()
+
+    @property
+    def algorithm(self):
+        return self._algorithm
+
+    @algorithm.setter
+    def algorithm(self, algorithm):
+        self._algorithm = algorithm
+        self.invalidate()
+
+    @property
+    def fill(self):
+        return self._fill
+
+    @fill.setter
+    def fill(self, fill):
+        self._fill = fill
+        self.invalidate()
+
+    @property
+    def isDrawFinished(self):
+        return self._isDrawFinished
+
+    @isDrawFinished.setter
+    def isDrawFinished(self, isDrawFinished):
+        self._isDrawFinished = isDrawFinished
+        self.invalidate()
+
+    @property
+    def preview(self):
+        return self._preview
+
+    @preview.setter
+    def preview(self, preview):
+        if getattr(self, '_preview', None) != preview:
+            self._preview = preview
+            self.invalidate()
+
+    def set_point(self, index, point):
+        """修改第index个控制点"""
+        self._p_list[index] = point
+        self.invalidate()
+
+    def insert_point(self, index, point):
+        """在第index个控制点之前插入控制点"""
+        self._p_list.insert(index, point)
+        self.invalidate()
+
+    def append_point(self, point):
+        self._p_list.append(point)
+        self.invalidate()
+
+    def invalidate(self):
+        """丢弃缓存的光栅化结果，下次重绘时重新计算"""
+        self.prepareGeometryChange()    # 此时仍返回缓存的旧包围矩形，场景据此重绘旧区域与新区域
+        self._pixels = None
+        self._points = None
+        self._pixel_lines = None
+        self._control_points = None
+        self._pixel_array = None
+        self._spans = None
+        self._span_lines = None
+        self._bounds = None
+        if self.index is not None:
+            self.index.mark_stale(self)
+
+    def pixels(self):
+        """图元的像素点坐标列表，缓存至图元参数改变"""
+        if self._pixels is None:
+            if self.item_type == 'line':
+                self._pixels = alg.draw_line(self.p_list, self.algorithm)
+            elif self.item_type == 'polygon':
+                self._pixels = alg.draw_polygon(self.p_list, self.algorithm)
+            elif self.item_type == 'ellipse':
+                self._pixels = alg.draw_ellipse(self.p_list, self.algorithm)
+            elif self.item_type == 'curve' and self.preview:
+                self._pixels = vec.draw_curve(self.p_list, self.algorithm, adaptive=True, tolerance=PREVIEW_TOLERANCE)
+            elif self.item_type == 'curve':
+                self._pixels = alg.draw_curve(self.p_list, self.algorithm)
+            else:
+                self._pixels = []
+        return self._pixels
+
+    def spans(self):
+        """填充多边形的扫描线区间[[y, x_start, x_end], ...]，缓存至图元参数改变；不填充时为空"""
+        if self._spans is None:
+            self._spans = []
+            if self.item_type == 'polygon' and self.fill is not None:
+                self._spans = alg.fill_polygon(self.p_list, self.fill)
+        return self._spans
+
+    def span_lines(self):
+        """填充区间对应的水平线段，一次drawLines画出"""
+        if self._span_lines is None:
+            self._span_lines = [QLine(x_start, y, x_end, y) for y, x_start, x_end in self.spans()]
+        return self._span_lines
+
+    def pixel_lines(self):
+        """图元像素中同一行上相邻的像素合并成的水平线段，一次drawLines画出，缓存至图元参数改变"""
+        if self._pixel_lines is None:
+            self._split_runs()
+        return self._pixel_lines
+
+    def points(self):
+        """不在pixel_lines中的单个像素的QPolygon，缓存至图元参数改变"""
+        if self._points is None:
+            self._split_runs()
+        return self._points
+
+    def row_spans(self):
+        """
+        图元像素按行合并成的水平区间[[y, x_start, x_end], ...]（区间之间可能重叠）。
+        直线、多边形与椭圆由cg_algorithms直接按行生成，不经过逐个像素；其余图元由像素合并
+        """
+        if self.item_type == 'line':
+            return alg.draw_line(self.p_list, self.algorithm, spans=True)
+        elif self.item_type == 'polygon':
+            return alg.draw_polygon(self.p_list, self.algorithm, spans=True)
+        elif self.item_type == 'ellipse':
+            return alg.draw_ellipse(self.p_list, self.algorithm, spans=True)
+        return vec.pixel_spans(self.pixels())
+
+    def _split_runs(self):
+        """
+        按水平区间拆分图元像素：长度大于1的区间画成一条线段，其余像素逐点画出。
+        奇数宽（大于1）的画笔画线段与画点的边缘取整不同，此时仍全部逐点画出，保持画面不变
+        """
+        if self.width == 1 or self.width % 2 == 0:
+            spans = np.asarray(self.row_spans(), np.int32).reshape(-1, 3)
+            long = spans[:, 2] > spans[:, 1]
+            lines = [QLine(*line) for line in spans[long][:, [1, 0, 2, 0]].tolist()]
+            points = spans[~long][:, [1, 0]]
+        else:
+            lines, points = [], self.pixels()
+        self._pixel_lines = lines
+        self._points = to_qpolygon(points)
+
+    def control_points(self):
+        """曲线绘制过程中显示的控制多边形像素的QPolygon"""
+        if self._control_points is None:
+            self._control_points = to_qpolygon(alg.draw_polygon(self.p_list, 'Bresenham'))
+        return self._control_points
+
     def finish_draw(self):
         self.isDrawFinished = True
+        self.preview = False
         self.computeCenter()
         self.last_p_list = self.p_list
 
@@ -325,12 +628,27 @@ class MyItem(QGraphicsItem):
     def center(self):
         return self.centerPoint
 
-    def contains(self, point):
-        boundingRect = self.boundingRect()
-        if boundingRect.left() <= point[0] and point[0] <= boundingRect.right():
-            if boundingRect.bottom() >= point[1] and point[1] >= boundingRect.top():
-                return True
-        return False
+    def bounds(self):
+        """控制点的包围盒[x_min, y_min, x_max, y_max]，缓存至图元参数改变；无控制点时为None"""
+        if self._bounds is None and len(self.p_list) > 0:
+            x_list = [p[0] for p in self.p_list]
+            y_list = [p[1] for p in self.p_list]
+            self._bounds = [min(x_list), min(y_list), max(x_list), max(y_list)]
+        return self._bounds
+
+    def distance(self, x, y):
+        """点(x, y)到图元像素的最短距离，落在填充区间内时为0，图元没有像素时为无穷大"""
+        for span_y, x_start, x_end in self.spans():
+            if span_y == int(y) and x_start <= x <= x_end:
+                return 0.0
+        if self._pixel_array is None:
+            self._pixel_array = np.asarray(self.pixels(), np.float64).reshape(-1, 2)
+        if len(self._pixel_array) == 0:
+            return math.inf
+        return math.sqrt(((self._pixel_array - [x, y]) ** 2).sum(axis=1).min())
+
+    def contains(self, point, tolerance=HIT_TOLERANCE):
+        return self.distance(point[0], point[1]) <= tolerance + self.width / 2
 
     def edit(self, edit_type, algorithm, params):
         if edit_type == 'translate':
@@ -350,94 +668,91 @@ class MyItem(QGraphicsItem):
             self.p_list = alg.clip(self.p_list, x_min, y_min, x_max, y_max, algorithm)
 
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = ...) -> None:
+        if self.item_type == 'polygon' and self.fill is not None:
+            painter.setPen(self.fill_pen)
+            painter.drawLines(self.span_lines())
         painter.setPen(self.pen)
-        if self.item_type == 'line':
-            item_pixels = alg.draw_line(self.p_list, self.algorithm)
-            for p in item_pixels:
-                painter.drawPoint(*p)
-            if self.selected:
-                painter.setPen(QColor(255, 0, 0))
-                painter.drawRect(self.boundingRect())
-        elif self.item_type == 'polygon':
-            item_pixels = alg.draw_polygon(self.p_list, self.algorithm)
-            for p in item_pixels:
-                painter.drawPoint(*p)
-            if self.selected:
-                painter.setPen(QColor(255, 0, 0))
-                painter.drawRect(self.boundingRect())    
-        elif self.item_type == 'ellipse':
-            item_pixels = alg.draw_ellipse(self.p_list, self.algorithm)
-            for p in item_pixels:
-                painter.drawPoint(*p)
-            if self.selected:
-                painter.setPen(QColor(255, 0, 0))
-                painter.drawRect(self.boundingRect()) 
-        elif self.item_type == 'curve':
-            item_pixels = alg.draw_curve(self.p_list, self.algorithm)
-            for p in item_pixels:
-                painter.drawPoint(*p)
-            if not self.isDrawFinished:
+        if self.item_type in ['line', 'polygon', 'ellipse', 'curve']:
+            painter.drawLines(self.pixel_lines())
+            painter.drawPoints(self.points())
+            if self.item_type == 'curve' and not self.isDrawFinished:
                 painter.setPen(QColor(0, 0, 255))
-                item_pixels = alg.draw_polygon(self.p_list, 'Bresenham')
-                for p in item_pixels:
-                    painter.drawPoint(*p)
+                painter.drawPoints(self.control_points())
             if self.selected:
                 painter.setPen(QColor(255, 0, 0))
-                painter.drawRect(self.boundingRect())   
+                painter.drawRect(self.outlineRect())
         elif self.item_type == 'rect':
-            painter.drawRect(self.boundingRect())     
+            painter.drawRect(self.outlineRect())
+
+    def outlineRect(self) -> QRectF:
+        """控制点外扩1像素的矩形，即选中时显示的边框"""
+        bounds = self.bounds()
+        if bounds is None:
+            return QRectF(0, 0, 0, 0)
+        x, y, x_max, y_max = bounds
+        return QRectF(x - 1, y - 1, x_max - x + 2, y_max - y + 2)
 
     def boundingRect(self) -> QRectF:
-        if len(self.p_list) == 0:
+        """绘制范围：边框再外扩画笔半宽，局部重绘时不会残留粗画笔画出的像素"""
+        if self.bounds() is None:
             return QRectF(0, 0, 0, 0)
-        x = min(self.p_list, key=lambda x: x[0])[0]
-        y = min(self.p_list, key=lambda y: y[1])[1]
-        w = max(self.p_list, key=lambda x: x[0])[0] - x
-        h = max(self.p_list, key=lambda y: y[1])[1] - y
-        return QRectF(x - 1, y - 1, w + 2, h + 2)
+        margin = self.width / 2 + 1
+        return self.outlineRect().adjusted(-margin, -margin, margin, margin)
     
     def copy(self):
-        return MyItem(self.canvas, self.id, self.item_type, self.p_list, self.algorithm, self.color, self.width, self.parent)
+        p_list = [list(p) for p in self.p_list]     # 不与原图元共享控制点，否则原地修改控制点时另一图元的缓存不会失效
+        return MyItem(self.canvas, self.id, self.item_type, p_list, self.algorithm, self.color, self.width, self.parent, self.fill)
 
 class MyGraphicsScene(QGraphicsScene):
     """
     自定义画板类，背景选择绘制网格线
+
+    网格预先绘制到一块可平铺的图块中，重绘背景时只需平铺该图块；
+    网格密度或缩放比例改变时才重新生成图块
     """
 
-    def __init__(self, *args, isShowGrid=False):
+    def __init__(self, *args, isShowGrid=False, gridDensity=GRID_DENSITY):
         super().__init__(*args)
         self.isShowGrid = isShowGrid
-    
+        self.gridDensity = gridDensity
+        self.grid_tile = None
+        self.grid_key = None        # (density, scale)，生成grid_tile时的参数
+
+    def get_grid_tile(self, scale):
+        """网格图块：边长为网格间距与虚线周期的最小公倍数，平铺后网格线与虚线都能无缝衔接
+
+        :param scale: (float) 视图的缩放比例，图块按设备像素生成，放大后网格线仍然清晰
+        :return: (QPixmap) 以场景坐标计边长的图块
+        """
+        key = (self.gridDensity, scale)
+        if self.grid_key != key:
+            density = self.gridDensity
+            size = density * GRID_DASH_PERIOD // math.gcd(density, GRID_DASH_PERIOD)
+            pixmap = QPixmap(math.ceil(size * scale), math.ceil(size * scale))
+            pixmap.fill(Qt.transparent)
+            pen = QPen()
+            pen.setColor(QColor(60,60,60))
+            pen.setWidth(1)
+            pen.setStyle(Qt.DashLine)
+            painter = QPainter(pixmap)
+            painter.scale(scale, scale)
+            painter.setPen(pen)
+            for i in range(0, size, density):
+                painter.drawLine(0, i, size, i)         # 横线
+                painter.drawLine(i, 0, i, size)         # 竖线
+            painter.end()
+            pixmap.setDevicePixelRatio(scale)
+            self.grid_tile, self.grid_key = pixmap, key
+        return self.grid_tile
+
     def drawBackground(self, painter: QPainter, rect: QRectF) -> None:
         if not self.isShowGrid:
             return super().drawBackground(painter, rect)
-
-        # 边界值调整
-        density = 25
-        left = rect.left()
-        right = rect.right()
-        top = rect.top()
-        bottom = rect.bottom()
-        left = (left / density) * density
-        right = (right / density) * density
-        top = (top / density) * density
-        bottom = (bottom / density) * density
-        # 设置画笔
-        pen = QPen()
-        pen.setColor(QColor(60,60,60))
-        pen.setWidth(1)
-        pen.setStyle(Qt.DashLine)
-        painter.setPen(pen)
-        # 绘制横线
-        for i in range(0, int(top-1), -density):       # 绘制Y轴正半轴
-            painter.drawLine(left, i, right, i)
-        for i in range(0, int(bottom+1), density):       # 绘制Y轴负半轴
-            painter.drawLine(left, i, right, i)
-        # 绘制竖线
-        for i in range(0, int(right+1), density):       # 绘制X轴正半轴
-            painter.drawLine(i, top, i, bottom)
-        for i in range(0, int(left-1), -density):       # 绘制X轴负半轴
-            painter.drawLine(i, top, i, bottom)
+        tile = self.get_grid_tile(painter.worldTransform().m11())
+        size = tile.width() / tile.devicePixelRatio()
+        # 图块原点对齐场景原点，网格线落在网格间距的整数倍上
+        offset = QPointF(rect.left() % size, rect.top() % size)
+        painter.drawTiledPixmap(rect, tile, offset)
 
 
 # 主窗体的宽与高
@@ -515,6 +830,9 @@ class MainWindow(QMainWindow):
         polygon_menu.setFont(FONT)
         polygon_dda_act = polygon_menu.addAction('DDA')
         polygon_bresenham_act = polygon_menu.addAction('Bresenham')
+        polygon_menu.addSeparator()
+        polygon_evenodd_act = polygon_menu.addAction('填充（奇偶规则）')
+        polygon_nonzero_act = polygon_menu.addAction('填充（非零环绕规则）')
         ellipse_act = draw_menu.addAction('椭圆')
         ellipse_act.setIcon(QIcon("gui_files/ImageIcon/ellipse.png"))
         curve_menu = draw_menu.addMenu('曲线')
@@ -552,6 +870,8 @@ class MainWindow(QMainWindow):
         line_bresenham_act.triggered.connect(self.line_bresenham_action)        # bresenham生成直线
         polygon_dda_act.triggered.connect(self.polygon_dda_action)              # dda生成多边形
         polygon_bresenham_act.triggered.connect(self.polygon_bresenham_action)  # bresenham生成多边形
+        polygon_evenodd_act.triggered.connect(self.polygon_evenodd_action)      # 奇偶规则填充多边形
+        polygon_nonzero_act.triggered.connect(self.polygon_nonzero_action)      # 非零环绕规则填充多边形
         ellipse_act.triggered.connect(self.ellipse_action)                      # 生成椭圆
         curve_bezier_act.triggered.connect(self.curve_bezier_action)            # bezier生成曲线
         curve_b_spline_act.triggered.connect(self.curve_b_spline_action)        # b_spline生成曲线
@@ -668,6 +988,16 @@ class MainWindow(QMainWindow):
         self.statusBar().showMessage('Bresenham算法绘制多边形')
         self.canvas_widget.clear_selection()
         self.statusBar().showMessage('Bresenham算法绘制多边形：按住左键移动，然后松开完成多边形一条边的绘制，点击右键完成绘制，多边形首末点会自动连接一条线')
+
+    def polygon_evenodd_action(self):
+        self.canvas_widget.start_draw_polygon('Bresenham', self.get_id(), 'evenodd')
+        self.statusBar().showMessage('绘制填充多边形（奇偶规则，自相交部分重叠两次的区域不填充）：绘制方法同多边形')
+        self.canvas_widget.clear_selection()
+
+    def polygon_nonzero_action(self):
+        self.canvas_widget.start_draw_polygon('Bresenham', self.get_id(), 'nonzero')
+        self.statusBar().showMessage('绘制填充多边形（非零环绕规则，环绕数不为0的区域都填充）：绘制方法同多边形')
+        self.canvas_widget.clear_selection()
     
     def ellipse_action(self):
         self.canvas_widget.start_draw_ellipse('', self.get_id())
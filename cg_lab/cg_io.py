@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# 画布输出：多种格式的保存、直接映射到BMP文件的画布
+
+import struct
+import numpy as np
+from PIL import Image
+
+BMP_HEADER_SIZE = 54                # BITMAPFILEHEADER(14) + BITMAPINFOHEADER(40)
+BMP_PPM = 3780                      # 96 dpi，与PIL保存的BMP一致
+
+
+def bmp_header(width, height):
+    """24位无压缩BMP的文件头与信息头
+
+    :return: (bytes, int) 54字节的头部，每行像素占用的字节数（按4字节对齐）
+    """
+    row_size = (width * 3 + 3) // 4 * 4
+    image_size = row_size * height
+    header = struct.pack('<2sIHHI', b'BM', BMP_HEADER_SIZE + image_size, 0, 0, BMP_HEADER_SIZE)
+    header += struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0, image_size, BMP_PPM, BMP_PPM, 0, 0)
+    return header, row_size
+
+
+def bmp_memmap(path, width, height):
+    """创建BMP文件并将其像素区映射为画布，写入画布即写入文件，不在内存中另存整幅图像
+
+    BMP按行自下而上存储，每个像素为BGR顺序，每行补齐到4字节；返回的画布视图已处理好这些差异，
+    canvas[y, x] = [R, G, B] 即写入文件中对应位置
+    :param path: (string) BMP文件路径
+    :param width, height: (int) 画布大小
+    :return: (np.memmap, np.ndarray of uint8: (height, width, 3)) 整个文件的映射，及按[y, x, RGB]索引的画布视图
+    """
+    header, row_size = bmp_header(width, height)
+    mm = np.memmap(path, np.uint8, 'w+', shape=BMP_HEADER_SIZE + row_size * height)
+    mm[:BMP_HEADER_SIZE] = np.frombuffer(header, np.uint8)
+    rows = mm[BMP_HEADER_SIZE:].reshape(height, row_size)
+    canvas = rows[::-1, :width * 3].reshape(height, width, 3)[:, :, ::-1]
+    return mm, canvas
+
+
+# 输出格式 ---> 文件扩展名
+FORMATS = {
+    'bmp': '.bmp',                  # 无压缩位图
+    'png': '.png',                  # 无损压缩，compress_level可调（0最快~9最小）
+    'npy': '.npy',                  # NumPy数组(H, W, 3)，带形状信息，读写最快
+    'raw': '.rgb',                  # 无文件头的RGB字节流，按行优先排列，共H*W*3字节
+}
+
+
+def save_image(canvas, path, fmt='bmp', compress_level=6):
+    """按指定格式保存画布
+
+    :param canvas: (np.ndarray of uint8: (H, W, 3)) 画布
+    :param path: (string) 文件路径（含扩展名）
+    :param fmt: (string) 输出格式，见FORMATS
+    :param compress_level: (int) PNG压缩等级，0~9
+    """
+    if fmt == 'bmp':
+        Image.fromarray(canvas).save(path, 'bmp')
+    elif fmt == 'png':
+        Image.fromarray(canvas).save(path, 'png', compress_level=compress_level)
+    elif fmt == 'npy':
+        np.save(path, np.ascontiguousarray(canvas))
+    elif fmt == 'raw':
+        np.ascontiguousarray(canvas).tofile(path)
+    else:
+        raise ValueError(f'Unknown output format: {fmt}')
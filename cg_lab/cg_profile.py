@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# 指令文件的性能剖析：按指令类型与处理阶段统计耗时和次数，记录每个图元的像素数与每次saveCanvas的耗时
+
+import os
+import csv
+import json
+import time
+import cProfile
+import pstats
+import threading
+import contextlib
+from collections import defaultdict
+
+# 处理阶段，同一线程内各阶段互不嵌套
+PHASES = [
+    'parse',            # 指令行拆分
+    'transform',        # 变换矩阵的复合与施加
+    'clip',             # 线段裁剪
+    'rasterize',        # 图元光栅化（含包围盒剔除与预裁剪）
+    'bounds',           # 预裁剪后残留的窗口外像素的剔除
+    'composite',        # 擦除旧像素并按绘制顺序写入画布
+    'render_tiles',     # 分块并行画布：等待各工作进程完成光栅化与写入
+    'snapshot',         # 复制画布快照交给后台写盘
+    'backpressure',     # 待写快照已满，等待后台写盘
+    'encode',           # 图像编码与写盘（后台线程中）
+    'export',           # 内存映射画布直接复制BMP文件
+]
+
+
+class NullProfiler:
+    """不做任何记录，未开启剖析时使用，开销只有一次方法调用"""
+
+    enabled = False
+
+    def command(self, name):
+        return contextlib.nullcontext()
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def count(self, name, value=1):
+        pass
+
+    def reset_canvas(self):
+        pass
+
+    def item_pixels(self, item_id, item_type, pixels):
+        pass
+
+    def saved(self, path, fmt, seconds):
+        pass
+
+    def encoded(self, path, seconds):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler(NullProfiler):
+    """
+    记录指令与阶段的耗时；encode阶段在后台写盘线程中执行，故统计需加锁。
+    指令耗时包含其中各阶段的耗时，各阶段之和不含指令分派本身的开销
+    """
+
+    enabled = True
+
+    def __init__(self, cprofile=False):
+        """
+        :param cprofile: (bool) 是否为主线程中的每个阶段分别收集cProfile数据
+        """
+        self.cprofile = cprofile
+        self.lock = threading.Lock()
+        self.profiles = {}                      # phase ---> cProfile.Profile，只在主线程中使用
+        self.commands = defaultdict(lambda: [0, 0.0])   # command ---> [count, seconds]
+        self.phases = defaultdict(lambda: [0, 0.0])     # phase ---> [count, seconds]
+        self.counters = defaultdict(int)
+        self.canvas_index = 0                   # 已执行的resetCanvas次数，区分不同画布上同名的图元
+        self.items = {}                         # (canvas_index, item_id) ---> {'type', 'pixels', 'draws'}
+        self.saves = []                         # [{'path', 'format', 'seconds', 'encode_seconds'}]
+        self.encode_seconds = {}                # path ---> seconds
+        self.start_time = self.stop_time = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        self.stop_time = time.perf_counter()
+
+    @contextlib.contextmanager
+    def command(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.commands[name]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        profile = None
+        if self.cprofile and threading.current_thread() is threading.main_thread():
+            if name not in self.profiles:
+                self.profiles[name] = cProfile.Profile()
+            profile = self.profiles[name]
+            profile.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            with self.lock:
+                entry = self.phases[name]
+                entry[0] += 1
+                entry[1] += seconds
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def reset_canvas(self):
+        """resetCanvas后图元编号可以重新使用，之后的图元记在新的画布下"""
+        self.canvas_index += 1
+
+    def item_pixels(self, item_id, item_type, pixels):
+        """记录图元最近一次光栅化后落在画布内的像素数"""
+        entry = self.items.setdefault((self.canvas_index, item_id), {'type': item_type, 'pixels': 0, 'draws': 0})
+        entry['type'] = item_type
+        entry['pixels'] = int(pixels)
+        entry['draws'] += 1
+
+    def saved(self, path, fmt, seconds):
+        """记录一次saveCanvas在指令循环中的耗时（后台编码另计）"""
+        self.saves.append({'path': path, 'format': fmt, 'seconds': seconds})
+
+    def encoded(self, path, seconds):
+        with self.lock:
+            self.encode_seconds[path] = seconds
+
+    def report(self):
+        """
+        :return: (dict) 可直接保存为JSON的剖析结果
+        """
+        total = None
+        if self.start_time is not None:
+            total = (self.stop_time or time.perf_counter()) - self.start_time
+        phases = {name: {'count': count, 'seconds': seconds}
+                  for name, (count, seconds) in sorted(self.phases.items(), key=lambda kv: PHASES.index(kv[0]))}
+        commands = {name: {'count': count, 'seconds': seconds}
+                    for name, (count, seconds) in sorted(self.commands.items(), key=lambda kv: -kv[1][1])}
+        items = [dict(canvas=canvas_index, item_id=item_id, **entry)
+                 for (canvas_index, item_id), entry in self.items.items()]
+        saves = [dict(save, encode_seconds=self.encode_seconds.get(save['path'])) for save in self.saves]
+        return {'total_seconds': total, 'commands': commands, 'phases': phases,
+                'counters': dict(self.counters), 'items': items, 'saves': saves}
+
+    def write(self, path):
+        """保存剖析结果，扩展名为.csv时保存为CSV（section, name, count, seconds, value），否则为JSON"""
+        report = self.report()
+        if os.path.splitext(path)[1].lower() != '.csv':
+            with open(path, 'w') as fp:
+                json.dump(report, fp, indent=2)
+            return
+        with open(path, 'w', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['section', 'name', 'count', 'seconds', 'value'])
+            writer.writerow(['total', '', '', report['total_seconds'], ''])
+            for section in ('commands', 'phases'):
+                for name, entry in report[section].items():
+                    writer.writerow([section, name, entry['count'], entry['seconds'], ''])
+            for name, value in report['counters'].items():
+                writer.writerow(['counters', name, '', '', value])
+            for entry in report['items']:       # name为 画布序号:图元编号
+                writer.writerow(['items', f"{entry['canvas']}:{entry['item_id']}", entry['draws'], '', entry['pixels']])
+            for save in report['saves']:
+                writer.writerow(['saves', save['path'], '', save['seconds'], save['encode_seconds']])
+
+    def dump_cprofile(self, directory):
+        """
+        每个阶段的cProfile数据写入directory/<phase>.prof，可用pstats或snakeviz查看。
+        同一进程内同时只能有一个cProfile处于启用状态（Python 3.12起同时启用会抛出ValueError），
+        故只收集主线程中的阶段；后台线程中的encode阶段只计时，--save-workers 0同步保存时才有encode.prof
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, profile in self.profiles.items():
+            pstats.Stats(profile).dump_stats(os.path.join(directory, name + '.prof'))
@@ -0,0 +1,714 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# NumPy向量化的光栅化算法，输出与cg_algorithms逐像素一致
+# cg_algorithms只允许依赖math库，故向量化实现单独放在本文件中
+import math
+import itertools
+import numpy as np
+import cg_algorithms as alg
+
+
+def _empty():
+    return np.empty((0, 2), np.int32)
+
+
+def draw_line(p_list, algorithm):
+    """绘制线段（向量化）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 线段的起点和终点坐标
+    :param algorithm: (string) 绘制使用的算法，包括'Naive'、'DDA'和'Bresenham'
+    :return: (np.ndarray of int32: (N, 2)) 绘制结果的像素点坐标数组，与alg.draw_line的结果逐点相同
+    """
+    if len(p_list) == 0:
+        return _empty()
+    return draw_lines([[*p_list[0], *p_list[1]]], algorithm)
+
+
+def _expand(counts, first=None):
+    """将每条线段的像素数展开为(线段编号, 步数)两个等长数组，first给出时每条线段的步数从first开始"""
+    owner = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    step = np.arange(counts.sum()) - starts[owner]
+    if first is not None:
+        step += first[owner]
+    return owner, step
+
+
+def _accumulate(start, delta, counts):
+    """分段逐步累加 start, start + delta, start + 2 * delta, ...（共counts个）
+
+    按长度的数量级将线段分桶，每桶填成矩阵后沿行做cumsum，
+    行内仍是逐项顺序累加，舍入误差与标量版本的 x = x + dx 完全相同
+    """
+    out = np.empty(counts.sum())
+    offsets = np.cumsum(counts) - counts
+    bucket = np.log2(counts).astype(np.int64)
+    for b in np.unique(bucket):
+        idx = np.nonzero(bucket == b)[0]
+        n = counts[idx].max()
+        block = np.empty((len(idx), n))
+        block[:] = delta[idx, None]
+        block[:, 0] = start[idx]
+        np.cumsum(block, axis=1, out=block)
+        cols = np.arange(n)
+        mask = cols < counts[idx, None]
+        out[(offsets[idx, None] + cols)[mask]] = block[mask]
+    return out
+
+
+def _visible_steps(x0, y0, x1, y1, counts, window):
+    """逐步绘制的线段中可能落在窗口内的步数范围
+
+    第k步的像素与理想线段上 t = k / (counts - 1) 处的点在每个方向上相差不超过1.5个像素（各算法的取整方式不同，均在此界内），
+    故对外扩2个像素的窗口做Liang-Barsky裁剪，所得区间再向两端各放宽一步，即包含全部落在窗口内的步
+    :param x0, y0, x1, y1: (np.ndarray of int) 按绘制方向排列的线段端点，第0步在(x0, y0)
+    :param counts: (np.ndarray of int) 每条线段的总步数
+    :param window: (list of int) [x_min, y_min, x_max, y_max]，包含边界
+    :return: (np.ndarray of int, np.ndarray of int) 每条线段的起始步数，及从该步起需要绘制的步数（整条线段都在窗口外时为0）
+    """
+    x_min, y_min, x_max, y_max = window
+    t_low, t_high, visible = _clip_params(x0, y0, x1, y1, x_min - 2, y_min - 2, x_max + 2, y_max + 2)
+    n = np.maximum(counts - 1, 0)
+    first = np.clip(np.floor(t_low * n).astype(np.int64) - 1, 0, n)
+    last = np.clip(np.ceil(t_high * n).astype(np.int64) + 1, 0, n)
+    return first, np.where(visible & (counts > 0), last - first + 1, 0)
+
+
+# 带窗口的DDA在可见部分之前最多逐步累加这么多步，以与标量版本的舍入逐点一致；
+# 窗口外的前缀更长时改为直接计算起点 x0 + first * dx，耗时与内存只取决于可见部分
+DDA_EXACT_PREFIX = 1 << 16
+
+
+def draw_lines(segments, algorithm, return_counts=False, window=None):
+    """批量绘制M条线段，一次向量化计算全部像素
+
+    :param segments: (array-like of int: (M, 2, 2)或(M, 4)) 每行为一条线段的 [x0, y0, x1, y1]
+    :param algorithm: (string) 绘制使用的算法，包括'Naive'、'DDA'和'Bresenham'
+    :param return_counts: (bool) 是否同时返回每条线段的像素数
+    :param window: (list of int) [x_min, y_min, x_max, y_max]，给出时只绘制可能落在该窗口内的一段，
+                   结果包含完整结果中窗口内的全部像素，窗口外只多出边界附近的少量像素，仍需调用者剔除
+    :return: (np.ndarray of int32: (N, 2)) 按线段顺序拼接的像素点坐标数组，与逐条调用draw_line的结果相同；
+             若return_counts为True，另返回(np.ndarray of int: (M,))每条线段的像素数
+    """
+    seg = np.asarray(segments, np.int64).reshape(-1, 4)
+    x0, y0, x1, y1 = seg.T
+    if algorithm == 'Naive':
+        vertical = x0 == x1
+        flip = x0 > x1
+        x0, y0, x1, y1 = (np.where(flip, x1, x0), np.where(flip, y1, y0),
+                          np.where(flip, x0, x1), np.where(flip, y0, y1))
+        counts = np.where(vertical, np.maximum(y1 - y0 + 1, 0), x1 - x0 + 1)
+        first = None
+        if window is not None:
+            first, counts = _visible_steps(x0, y0, x1, y1, counts, window)
+        owner, step = _expand(counts, first)
+        v = vertical[owner]
+        k = (y1 - y0)[owner] / np.where(vertical, 1, x1 - x0)[owner]
+        x = np.where(v, x0[owner], x0[owner] + step)
+        y = np.where(v, y0[owner] + step, (y0[owner] + k * step).astype(np.int32))
+    elif algorithm == 'DDA':
+        length = np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))
+        counts = length + 1
+        first = np.zeros(len(seg), np.int64)
+        if window is not None:
+            first, counts = _visible_steps(x0, y0, x1, y1, counts, window)
+            keep = counts > 0
+            seg, length, first, counts = seg[keep], length[keep], first[keep], counts[keep]
+            x0, y0, x1, y1 = seg.T
+        # 逐步累加须从第0步开始才与标量版本的舍入一致，故先累加到最后一步，再丢弃first之前的步；
+        # 窗口外的前缀超过DDA_EXACT_PREFIX步时直接从 x0 + skip * dx 开始累加，与逐步累加的结果相差若干个浮点舍入单位，
+        # 只在坐标恰好落在取整的分界处时相差一个像素（此时逐步累加本身的累积误差已不可忽略）
+        safe = np.maximum(length, 1)
+        dx, dy = (x1 - x0) / safe, (y1 - y0) / safe
+        skip = np.where(first > DDA_EXACT_PREFIX, first, 0)
+        first = first - skip
+        total = first + counts
+        x = _accumulate(np.where(skip > 0, x0 + skip * dx, x0), dx, total) + 0.5
+        y = _accumulate(np.where(skip > 0, y0 + skip * dy, y0), dy, total) + 0.5
+        # 起终点重合时标量版本直接输出(x0, y0)，不做四舍五入
+        single = np.nonzero(length == 0)[0]
+        starts = np.cumsum(total) - total
+        x[starts[single]] = x0[single]
+        y[starts[single]] = y0[single]
+        if window is not None:
+            _, step = _expand(total)
+            x, y = x[step >= first.repeat(total)], y[step >= first.repeat(total)]
+            full = np.zeros(len(keep), np.int64)
+            full[keep] = counts
+            counts = full
+    elif algorithm == 'Bresenham':
+        dx, dy = np.abs(x1 - x0), np.abs(y1 - y0)
+        sx, sy = np.sign(x1 - x0), np.sign(y1 - y0)
+        interchange = dy > dx
+        dx, dy = np.where(interchange, dy, dx), np.where(interchange, dx, dy)
+        counts = dx + 1
+        first = None
+        if window is not None:
+            first, counts = _visible_steps(x0, y0, x1, y1, counts, window)
+        owner, major = _expand(counts, first)
+        d_x, d_y = dx[owner], dy[owner]
+        minor = np.where(d_x == 0, 0, (2 * d_y * major + d_x - 1) // np.maximum(2 * d_x, 1))
+        swap = interchange[owner]
+        x = x0[owner] + sx[owner] * np.where(swap, minor, major)
+        y = y0[owner] + sy[owner] * np.where(swap, major, minor)
+    else:
+        counts = np.zeros(len(seg), np.int64)
+        x = y = np.empty(0)
+    pixels = np.column_stack((x, y)).astype(np.int32)
+    if return_counts:
+        return pixels, counts
+    return pixels
+
+
+def line_spans(segments, algorithm, return_counts=False, window=None):
+    """批量按行输出M条线段的水平区间，与逐条调用alg.line_spans的结果相同
+
+    Bresenham算法直接求出每行的起止步（见alg.line_spans），耗时与内存只与线段跨越的行数有关；
+    DDA与Naive的取整依赖逐步累加，先由draw_lines批量求出像素，再把同一行上连续的像素合并为区间
+    :param segments: (array-like of int: (M, 2, 2)或(M, 4)) 每行为一条线段的 [x0, y0, x1, y1]
+    :param algorithm: (string) 绘制使用的算法，包括'Naive'、'DDA'和'Bresenham'
+    :param return_counts: (bool) 是否同时返回每条线段的区间数
+    :param window: (list of int) [x_min, y_min, x_max, y_max]，给出时只输出可能与该窗口相交的行，
+                   区间不裁剪到窗口，仍需调用者剔除与裁剪
+    :return: (np.ndarray of int64: (K, 3)) 按线段顺序拼接的区间[y, x_start, x_end]，x_start <= x_end；
+             若return_counts为True，另返回(np.ndarray of int: (M,))每条线段的区间数
+    """
+    seg = np.asarray(segments, np.int64).reshape(-1, 4)
+    if algorithm != 'Bresenham':
+        pixels, counts = draw_lines(seg, algorithm, return_counts=True, window=window)
+        x, y = pixels[:, 0].astype(np.int64), pixels[:, 1].astype(np.int64)
+        owner = np.repeat(np.arange(len(seg)), counts)
+        # 像素沿线段方向在x、y上都单调，同一行的像素连续出现，行号或线段改变处开始新的区间
+        start = np.ones(len(x), bool)
+        start[1:] = (y[1:] != y[:-1]) | (owner[1:] != owner[:-1])
+        first = np.flatnonzero(start)
+        last = np.append(first[1:], len(x))[:len(first)] - 1
+        spans = np.stack([y[first], np.minimum(x[first], x[last]), np.maximum(x[first], x[last])], axis=1)
+        if return_counts:
+            return spans, np.bincount(owner[first], minlength=len(seg))
+        return spans
+    x0, y0, x1, y1 = seg.T
+    dx, dy = np.abs(x1 - x0), np.abs(y1 - y0)
+    sx, sy = np.sign(x1 - x0), np.sign(y1 - y0)
+    steep = dy > dx                     # y为主方向：每行恰好一个像素
+    major, minor = np.where(steep, dy, dx), np.where(steep, dx, dy)
+    first, counts = np.zeros(len(seg), np.int64), dy + 1
+    if window is not None:
+        # 可能可见的步数范围换算为行号范围，x为主方向时第i步的行号为 (2·dy·i + dx - 1) // (2·dx)
+        step, steps = _visible_steps(x0, y0, x1, y1, major + 1, window)
+        last = step + steps - 1
+        first = np.where(steep, step, (2 * minor * step + major - 1) // np.maximum(2 * major, 1))
+        last = np.where(steep, last, (2 * minor * last + major - 1) // np.maximum(2 * major, 1))
+        counts = np.where(steps > 0, last - first + 1, 0)
+    # 两类线段分别计算，再按线段顺序放回
+    spans = np.empty((counts.sum(), 3), np.int64)
+    offsets = np.cumsum(counts) - counts
+    for is_steep in (True, False):
+        group = np.flatnonzero(steep == is_steep)
+        owner, m = _expand(counts[group], first[group])
+        owner = group[owner]
+        d_x, d_y, s_x, x_0 = dx[owner], dy[owner], sx[owner], x0[owner]
+        rows = np.empty((len(owner), 3), np.int64)
+        rows[:, 0] = y0[owner] + sy[owner] * m
+        if is_steep:
+            rows[:, 1] = rows[:, 2] = x_0 + s_x * ((2 * d_x * m + d_y - 1) // (2 * d_y))
+        else:
+            # 第m行从满足 2·dy·i + dx - 1 >= 2·dx·m 的最小的步i开始，到下一行的起始步之前为止（dy为0时只有一行）
+            denominator = np.maximum(2 * d_y, 1)
+            start = np.where(m == 0, 0, -((d_x - 1 - 2 * d_x * m) // denominator))
+            end = np.minimum(-((d_x - 1 - 2 * d_x * (m + 1)) // denominator) - 1, d_x)
+            xa, xb = x_0 + s_x * start, x_0 + s_x * end
+            rows[:, 1], rows[:, 2] = np.minimum(xa, xb), np.maximum(xa, xb)
+        spans[offsets[owner] + m - first[owner]] = rows
+    if return_counts:
+        return spans, counts
+    return spans
+
+
+def draw_polygon(p_list, algorithm):
+    """绘制多边形，全部边经draw_lines一次批量光栅化
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :return: (np.ndarray of int32: (N, 2)) 绘制结果的像素点坐标数组，与alg.draw_polygon的结果相同
+    """
+    if len(p_list) == 0:
+        return _empty()
+    vertices = np.asarray(p_list, np.int64).reshape(-1, 2)
+    return draw_lines(np.hstack((np.roll(vertices, 1, axis=0), vertices)), algorithm)
+
+
+# 四个象限的坐标符号
+QUADRANT_SIGNS = np.array([[1, 1], [-1, 1], [-1, -1], [1, -1]], np.int32)
+
+
+def _mirror(arcs, centers, swap):
+    """将原点处的弧按坐标轴（swap为True时另加对角线）对称映射，再平移到各自的中心
+
+    每段弧上的像素互不相同，映射后只有坐标轴与对角线上的像素会重合，按掩码跳过这些重复的映像，不必排序去重
+    :param arcs: (list of list of tuple of int) 每个图元的一段弧（非空），swap为True时满足 0 <= x <= y
+    :param centers: (list of tuple of int) 每个图元的中心
+    :return: (np.ndarray of int32: (N, 2), np.ndarray of int: (M,)) 按图元顺序排列、互不重复的像素点坐标数组，及每个图元的像素数
+    """
+    lengths = np.fromiter(map(len, arcs), np.int64, len(arcs))
+    points = itertools.chain.from_iterable(itertools.chain.from_iterable(arcs))
+    arc = np.fromiter(points, np.int32, 2 * lengths.sum()).reshape(-1, 1, 2)
+    if swap:
+        arc = np.concatenate((arc, arc[:, :, ::-1]), axis=1)
+    x, y = arc[..., 0], arc[..., 1]
+    keep = np.stack((np.ones_like(x, bool), x != 0, (x != 0) & (y != 0), y != 0), axis=-1)
+    if swap:
+        keep[:, 1] &= (x[:, 1] != y[:, 1])[:, None]          # 对角线上的像素交换坐标后不变
+    center = np.repeat(np.asarray(centers, np.int32).reshape(-1, 2), lengths, axis=0)
+    px = x[..., None] * QUADRANT_SIGNS[:, 0] + center[:, :1, None]
+    py = y[..., None] * QUADRANT_SIGNS[:, 1] + center[:, 1:, None]
+    owner = np.repeat(np.arange(len(arcs)), lengths)
+    counts = np.bincount(owner, keep.sum(axis=(1, 2)), len(arcs)).astype(np.int64)
+    return np.column_stack((px[keep], py[keep])), counts
+
+
+def draw_circles(p_lists, return_counts=False):
+    """批量绘制圆：中点圆算法逐个生成八分圆弧，再由NumPy一次映射到其余7个八分圆
+
+    :param p_lists: (list of list of list of int: (M, 2, 2)) 每个圆的正方形包围框左上角和右下角顶点坐标
+    :param return_counts: (bool) 是否同时返回每个圆的像素数
+    :return: (np.ndarray of int32: (N, 2)) 按圆的顺序拼接的像素点坐标数组，每个圆与alg.draw_circle的像素集合相同；
+             若return_counts为True，另返回(np.ndarray of int: (M,))每个圆的像素数
+    """
+    arcs, centers = [], []
+    for (x0, y0), (x1, y1) in p_lists:
+        if x0 != y0 or x1 != y1:
+            raise ValueError('To plot a circle, need a square enclosure!')
+        arcs.append(alg.circle_octant(abs(x1 - x0) // 2))
+        centers.append(((x0 + x1) // 2, (y0 + y1) // 2))
+    pixels, counts = _mirror(arcs, centers, True)
+    if return_counts:
+        return pixels, counts
+    return pixels
+
+
+def draw_circle(p_list):
+    """绘制圆，见draw_circles"""
+    return draw_circles([p_list])
+
+
+def draw_ellipses(p_lists, return_counts=False):
+    """批量绘制椭圆：中点椭圆算法逐个生成第一象限的弧，再由NumPy一次映射到其余3个象限
+
+    :param p_lists: (list of list of list of int: (M, 2, 2)) 每个椭圆的矩形包围框左上角和右下角顶点坐标
+    :param return_counts: (bool) 是否同时返回每个椭圆的像素数
+    :return: (np.ndarray of int32: (N, 2)) 按椭圆的顺序拼接的像素点坐标数组，每个椭圆与alg.draw_ellipse的像素集合相同；
+             若return_counts为True，另返回(np.ndarray of int: (M,))每个椭圆的像素数
+    """
+    arcs, centers = [], []
+    for (x0, y0), (x1, y1) in p_lists:
+        arcs.append(alg.ellipse_quadrant(abs(x1 - x0) // 2, abs(y1 - y0) // 2))
+        centers.append(((x0 + x1) // 2, (y0 + y1) // 2))
+    pixels, counts = _mirror(arcs, centers, False)
+    if return_counts:
+        return pixels, counts
+    return pixels
+
+
+def draw_ellipse(p_list):
+    """绘制椭圆，见draw_ellipses"""
+    return draw_ellipses([p_list])
+
+
+def _mirror_runs(y, x_start, x_end, owner, cx, cy):
+    """将原点处同一行上的区间 [y, x_start, x_end]（0 <= x_start <= x_end）关于x轴、y轴对称映射，再平移到各自的中心
+
+    输出顺序与alg.ellipse_spans相同：每个区间依次映射到第cy + y行与第cy - y行，每行先右后左；
+    y为0时只有一行，x_start为0时左右两段连成一个区间
+    :param y, x_start, x_end, owner, cx, cy: (np.ndarray of int: (R,)) 每个区间的行、起止横坐标、所属图元及其中心
+    :return: (np.ndarray of int64: (K, 3), np.ndarray of int: (K,)) 映射后的区间[y, x_start, x_end]及其所属图元
+    """
+    spans = np.empty((len(y), 2, 2, 3), np.int64)
+    spans[..., 0] = np.stack((cy + y, cy - y), axis=1)[:, :, None]
+    spans[:, :, 0, 1] = np.where(x_start == 0, cx - x_end, cx + x_start)[:, None]
+    spans[:, :, 0, 2] = (cx + x_end)[:, None]
+    spans[:, :, 1, 1] = (cx - x_end)[:, None]
+    spans[:, :, 1, 2] = (cx - x_start)[:, None]
+    keep = np.ones((len(y), 2, 2), bool)
+    keep[:, 1] &= (y != 0)[:, None]
+    keep[:, :, 1] &= (x_start != 0)[:, None]
+    return spans[keep], np.broadcast_to(owner[:, None, None], keep.shape)[keep]
+
+
+def _arc_runs(arcs, centers):
+    """将每段弧上y相同的相邻像素分组
+
+    :return: (np.ndarray of int: (N,) * 3, np.ndarray of int: (R,) * 2, np.ndarray of int: (M, 2))
+             弧上全部像素的x、y及所属图元，每组的首、末像素的下标，及每个图元的中心
+    """
+    lengths = np.fromiter(map(len, arcs), np.int64, len(arcs))
+    points = itertools.chain.from_iterable(itertools.chain.from_iterable(arcs))
+    x, y = np.fromiter(points, np.int64, 2 * lengths.sum()).reshape(-1, 2).T
+    owner = np.repeat(np.arange(len(arcs)), lengths)
+    start = np.ones(len(x), bool)
+    start[1:] = (y[1:] != y[:-1]) | (owner[1:] != owner[:-1])
+    first = np.flatnonzero(start)
+    last = np.append(first[1:], len(x))[:len(first)] - 1
+    return x, y, owner, first, last, np.asarray(centers, np.int64).reshape(-1, 2)
+
+
+def circle_spans(p_lists, return_counts=False):
+    """批量按行输出圆的水平区间，与逐个调用alg.draw_circle(..., spans=True)的结果相同
+
+    八分圆弧仍由alg.circle_octant逐个生成，按行合并与八分对称映射由NumPy一次完成，不逐个映射像素
+    :param p_lists: (list of list of list of int: (M, 2, 2)) 每个圆的正方形包围框左上角和右下角顶点坐标
+    :param return_counts: (bool) 是否同时返回每个圆的区间数
+    :return: (np.ndarray of int64: (K, 3)) 按圆的顺序拼接的区间[y, x_start, x_end]；
+             若return_counts为True，另返回(np.ndarray of int: (M,))每个圆的区间数
+    """
+    arcs, centers = [], []
+    for (x0, y0), (x1, y1) in p_lists:
+        if x0 != y0 or x1 != y1:
+            raise ValueError('To plot a circle, need a square enclosure!')
+        arcs.append(alg.circle_octant(abs(x1 - x0) // 2))
+        centers.append(((x0 + x1) // 2, (y0 + y1) // 2))
+    x, y, owner, first, last, center = _arc_runs(arcs, centers)
+    # 弧上x递增：同一行的区间从首个像素到末个像素；关于对角线的映像每个像素单独成为区间
+    runs, run_owner = _mirror_runs(y[first], x[first], x[last], owner[first], *center[owner[first]].T)
+    off = x != y
+    swapped, swapped_owner = _mirror_runs(x[off], y[off], y[off], owner[off], *center[owner[off]].T)
+    spans = np.concatenate((runs, swapped))
+    owners = np.concatenate((run_owner, swapped_owner))
+    order = np.argsort(owners, kind='stable')
+    if return_counts:
+        return spans[order], np.bincount(owners, minlength=len(arcs))
+    return spans[order]
+
+
+def ellipse_spans(p_lists, return_counts=False):
+    """批量按行输出椭圆的水平区间，与逐个调用alg.draw_ellipse(..., spans=True)的结果相同
+
+    第一象限的弧仍由alg.ellipse_quadrant逐个生成，按行合并与四分对称映射由NumPy一次完成，不逐个映射像素
+    :param p_lists: (list of list of list of int: (M, 2, 2)) 每个椭圆的矩形包围框左上角和右下角顶点坐标
+    :param return_counts: (bool) 是否同时返回每个椭圆的区间数
+    :return: (np.ndarray of int64: (K, 3)) 按椭圆的顺序拼接的区间[y, x_start, x_end]；
+             若return_counts为True，另返回(np.ndarray of int: (M,))每个椭圆的区间数
+    """
+    arcs, centers = [], []
+    for (x0, y0), (x1, y1) in p_lists:
+        arcs.append(alg.ellipse_quadrant(abs(x1 - x0) // 2, abs(y1 - y0) // 2))
+        centers.append(((x0 + x1) // 2, (y0 + y1) // 2))
+    x, y, owner, first, last, center = _arc_runs(arcs, centers)
+    # 弧上同一行的像素x递减：区间从末个像素到首个像素
+    spans, owners = _mirror_runs(y[first], x[last], x[first], owner[first], *center[owner[first]].T)
+    if return_counts:
+        return spans, np.bincount(owners, minlength=len(arcs))
+    return spans
+
+
+def pixel_runs(y, x):
+    """将互不重复的像素合并为水平区间：同一行上横坐标连续的像素为一个区间
+
+    :param y, x: (np.ndarray of int: (N,)) 按(y, x)升序排列、互不重复的像素坐标
+    :return: (np.ndarray of int: (K, 3)) 区间[y, x_start, x_end]
+    """
+    start = np.ones(len(x), bool)
+    start[1:] = (x[1:] != x[:-1] + 1) | (y[1:] != y[:-1])
+    first = np.flatnonzero(start)
+    lengths = np.diff(first, append=len(x))
+    return np.stack([y[first], x[first], x[first] + lengths - 1], axis=1)
+
+
+def span_pixels(spans):
+    """将水平区间展开为像素点（pixel_runs的逆过程）
+
+    :param spans: (np.ndarray of int: (K, 3)或(K, 4)) 区间[y, x_start, x_end, ...]，x_start <= x_end
+    :return: (np.ndarray of int: (N, 2), np.ndarray of int: (N,)) 按区间顺序排列的像素点坐标，及每个像素所在区间的序号
+    """
+    lengths = spans[:, 2] - spans[:, 1] + 1
+    starts = np.cumsum(lengths) - lengths
+    pixels = np.empty((lengths.sum(), 2), spans.dtype)
+    pixels[:, 0] = np.repeat(spans[:, 1] - starts, lengths) + np.arange(len(pixels))
+    pixels[:, 1] = np.repeat(spans[:, 0], lengths)
+    return pixels, np.repeat(np.arange(len(spans)), lengths)
+
+
+def pixel_spans(pixels):
+    """将像素点合并为水平区间（行程编码）：同一行上相邻的像素合并为一个区间，重复的像素只计一次
+
+    :param pixels: (array-like of int: (N, 2)) 像素点坐标
+    :return: (np.ndarray of int32: (K, 3)) 按y、x_start升序排列的互不相交的区间[y, x_start, x_end]
+    """
+    pixels = np.asarray(pixels, np.int32).reshape(-1, 2)
+    pixels = pixels[np.lexsort((pixels[:, 0], pixels[:, 1]))]
+    keep = np.ones(len(pixels), bool)
+    keep[1:] = (pixels[1:] != pixels[:-1]).any(axis=1)
+    pixels = pixels[keep]
+    return pixel_runs(pixels[:, 1], pixels[:, 0])
+
+
+# 三次均匀B样条的基矩阵：C(t) = [t^3, t^2, t, 1]·M·[P_(j-3), P_(j-2), P_(j-1), P_j]^T，t∈[0, 1)
+BSPLINE_MATRIX = np.array([[-1, 3, -3, 1],
+                           [3, -6, 3, 0],
+                           [-3, 0, 3, 0],
+                           [1, 4, 1, 0]]) / 6
+
+
+def _sample_count(p_list):
+    """与alg.draw_curve相同的采样数：控制点包围盒周长的两倍"""
+    points = np.asarray(p_list)
+    extent = points.max(axis=0) - points.min(axis=0)
+    return max(int(extent.sum()) * 2, 2)
+
+
+def bspline_points(p_list, u):
+    """三次均匀B样条曲线求值（基矩阵形式，非递归）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) m个控制点，m >= 4
+    :param u: (np.ndarray of float) 参数值，节点向量为0, 1, ..., m + 3，曲线定义在[3, m]上
+    :return: (np.ndarray of float: (len(u), 2)) 曲线上的型值点
+    """
+    # 与deBoor_Cox一致，u越过m时不存在的控制点P_m按0计
+    control = np.vstack((np.asarray(p_list, float), np.zeros((1, 2))))
+    m = len(control) - 1
+    span = np.clip(np.floor(u).astype(np.int64), 3, m)          # u∈[j, j+1)时只有P_(j-3)~P_j四个控制点起作用
+    t = u - span
+    basis = np.column_stack((t ** 3, t ** 2, t, np.ones_like(t))) @ BSPLINE_MATRIX
+    active = control[span[:, None] + np.arange(-3, 1)]         # (n, 4, 2)
+    return np.einsum('nk,nkd->nd', basis, active)
+
+
+def bezier_points(p_list, t):
+    """Bezier曲线批量求值：对全部参数值同时执行de Casteljau算法
+
+    每一轮的运算顺序与alg.de_Casteljau相同，结果逐位一致；不展开为幂基，高次曲线也没有相消误差
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) n+1个控制点
+    :param t: (np.ndarray of float) 参数值，取值范围[0, 1]
+    :return: (np.ndarray of float: (len(t), 2)) 曲线上的型值点
+    """
+    u = np.asarray(t, float)
+    v = 1 - u
+    Q = np.asarray(p_list, float).T[:, :, None] * np.ones_like(u)    # (2, n+1, len(t))
+    uQ = np.empty_like(Q[:, 1:])
+    for k in range(len(p_list) - 1, 0, -1):                         # 原地计算Q_i = (1-u)·Q_i + u·Q_(i+1)，i < k
+        np.multiply(u, Q[:, 1: k + 1], out=uQ[:, :k])
+        Q[:, :k] *= v
+        Q[:, :k] += uQ[:, :k]
+    return Q[:, 0].T
+
+
+def bspline_to_bezier(p_list):
+    """将三次均匀B样条的每一段转换为等价的三次Bezier曲线段
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) m个控制点，m >= 4
+    :return: (np.ndarray of float: (m-3, 4, 2)) 每段的4个Bezier控制点，按参数顺序排列
+    """
+    control = np.asarray(p_list, float)
+    P0, P1, P2, P3 = control[:-3], control[1:-2], control[2:-1], control[3:]
+    return np.stack(((P0 + 4 * P1 + P2) / 6, (2 * P1 + P2) / 3, (P1 + 2 * P2) / 3, (P1 + 4 * P2 + P3) / 6), axis=1)
+
+
+def _flatness(pieces):
+    """各Bezier段内部控制点到首末点连线段的最大距离，曲线在控制多边形的凸包内，故为曲线偏离弦的上界"""
+    start, end = pieces[:, :1], pieces[:, -1:]
+    chord = end - start
+    length2 = (chord ** 2).sum(axis=2)
+    s = ((pieces - start) * chord).sum(axis=2) / np.maximum(length2, 1e-12)
+    nearest = start + np.clip(s, 0, 1)[..., None] * chord
+    return np.sqrt(((pieces - nearest) ** 2).sum(axis=2)).max(axis=1)
+
+
+def _subdivide(pieces):
+    """de Casteljau算法在t=0.5处批量二分Bezier段，返回(左半段, 右半段)"""
+    n = pieces.shape[1] - 1
+    left, right = [pieces[:, 0]], [pieces[:, -1]]
+    Q = pieces
+    for _ in range(n):
+        Q = (Q[:, :-1] + Q[:, 1:]) / 2
+        left.append(Q[:, 0])
+        right.append(Q[:, -1])
+    return np.stack(left, axis=1), np.stack(right[::-1], axis=1)
+
+
+def _outside(pieces, window, margin):
+    """各段控制点的包围盒是否完全在外扩margin后的窗口之外（曲线段在控制点的凸包内，故整段都在窗口外）"""
+    x_min, y_min, x_max, y_max = window
+    low, high = pieces.min(axis=1), pieces.max(axis=1)
+    return ((high[:, 0] < x_min - margin) | (low[:, 0] > x_max + margin) |
+            (high[:, 1] < y_min - margin) | (low[:, 1] > y_max + margin))
+
+
+def flatten_bezier(pieces, tolerance=1.0, max_depth=16, window=None):
+    """自适应细分：将Bezier段反复二分，直到每段偏离其弦不超过tolerance
+
+    :param pieces: (np.ndarray of float: (K, n+1, 2)) K段n次Bezier曲线
+    :param tolerance: (float) 允许的最大偏离（像素）
+    :param max_depth: (int) 最大细分层数
+    :param window: (list of int) [x_min, y_min, x_max, y_max]，给出时完全在窗口外的段不再细分，直接以弦代替；
+                   弦也在该段的凸包内，窗口内的折线不变
+    :return: (np.ndarray of float: (V, 2)) 按参数顺序排列的折线顶点
+    """
+    K = len(pieces)
+    key = np.arange(K, dtype=float)                             # 段号 + 起始参数，用于恢复参数顺序
+    size = np.ones(K)
+    done_pieces, done_key = [], []
+    for depth in range(max_depth + 1):
+        flat = _flatness(pieces) <= tolerance
+        if window is not None:
+            flat |= _outside(pieces, window, 2)
+        if depth == max_depth:
+            flat[:] = True
+        done_pieces.append(pieces[flat])
+        done_key.append(key[flat])
+        pieces, key, size = pieces[~flat], key[~flat], size[~flat] / 2
+        if len(pieces) == 0:
+            break
+        left, right = _subdivide(pieces)
+        pieces = np.concatenate((left, right))
+        key = np.concatenate((key, key + size))
+        size = np.concatenate((size, size))
+    pieces = np.concatenate(done_pieces)[np.argsort(np.concatenate(done_key))]
+    return np.vstack((pieces[:, 0], pieces[-1:, -1]))
+
+
+def draw_polyline(vertices, algorithm='Bresenham', window=None):
+    """绘制折线，返回连通且无重复的像素点
+
+    :param vertices: (array-like of float: (V, 2)) 折线顶点，四舍五入到像素
+    :param algorithm: (string) 绘制各段所用的直线算法，'DDA'或'Bresenham'
+    :param window: (list of int) [x_min, y_min, x_max, y_max]，给出时各段只绘制可能落在窗口内的部分，见draw_lines
+    :return: (np.ndarray of int32: (N, 2)) 沿折线顺序排列、互不重复的像素点坐标数组
+    """
+    vertices = (np.asarray(vertices, float) + 0.5).astype(np.int64)
+    keep = np.append(True, (vertices[1:] != vertices[:-1]).any(axis=1))
+    vertices = vertices[keep]
+    if len(vertices) == 1:
+        return vertices.astype(np.int32)
+    pixels = draw_lines(np.hstack((vertices[:-1], vertices[1:])), algorithm, window=window)
+    _, first = np.unique(pixels.view(np.int64), return_index=True)      # 每个像素的(x, y)视为一个int64整体去重
+    return pixels[np.sort(first)]
+
+
+def draw_curve(p_list, algorithm, adaptive=False, tolerance=1.0, line_algorithm='Bresenham', window=None):
+    """绘制曲线（向量化）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'（三次均匀B样条曲线）
+    :param adaptive: (bool) False时按包围盒周长均匀采样（与alg.draw_curve一致）；
+                     True时自适应细分到每段偏离不超过tolerance，再用line_algorithm连接各段，结果连通且无重复像素
+    :param tolerance: (float) 自适应细分的平直度阈值（像素）
+    :param line_algorithm: (string) 自适应模式下连接各段的直线算法
+    :param window: (list of int) [x_min, y_min, x_max, y_max]，给出时跳过完全在窗口外的曲线段，
+                   结果包含完整结果中窗口内的全部像素，窗口外的像素仍需调用者剔除
+    :return: (np.ndarray of int32: (N, 2)) 绘制结果的像素点坐标数组
+    """
+    if len(p_list) == 0:
+        return _empty()
+    if adaptive:
+        if algorithm == 'Bezier':
+            pieces = np.asarray(p_list, float)[None]
+        elif algorithm == 'B-spline' and len(p_list) > 3:
+            pieces = bspline_to_bezier(p_list)
+        else:
+            return _empty()
+        return draw_polyline(flatten_bezier(pieces, tolerance, window=window), line_algorithm, window)
+    if algorithm == 'B-spline':
+        m = len(p_list)
+        if m <= 3:
+            return _empty()
+        # 与alg.draw_curve相同的参数序列 u += gap（逐步累加），u达到m后停止
+        n_points = _sample_count(p_list)
+        u = np.cumsum(np.r_[3.0, np.full(n_points + 2, (m - 3) / n_points)])
+        u = u[1:][u[:-1] < m]
+        if window is not None:      # 只对与窗口相交的B样条段求值
+            control = np.vstack((np.asarray(p_list, float), np.zeros((1, 2))))
+            segments = control[np.arange(3, m + 1)[:, None] + np.arange(-3, 1)]
+            span = np.clip(np.floor(u).astype(np.int64), 3, m)
+            u = u[~_outside(segments, window, 2)[span - 3]]
+        points = bspline_points(p_list, u)
+    elif algorithm == 'Bezier':
+        # 与alg.draw_curve相同的参数序列 t += gap（逐步累加），t超过1后停止
+        n_points = _sample_count(p_list)
+        t = np.cumsum(np.r_[0.0, np.full(n_points + 1, 1 / n_points)])
+        points = bezier_points(p_list, t[t <= 1])
+    else:
+        return _empty()
+    return (points + 0.5).astype(np.int32)
+
+
+def translate_matrix(tx, ty):
+    """平移变换的齐次矩阵（列向量形式，[x2, y2, 1]^T = M·[x1, y1, 1]^T）"""
+    return np.array([[1.0, 0, tx],
+                     [0, 1, ty],
+                     [0, 0, 1]])
+
+
+def rotate_matrix(rx, ry, r):
+    """绕(rx, ry)旋转r度的齐次矩阵，旋转方向与alg.rotate一致
+
+    矩阵作用于相对旋转中心的坐标 [x1 - rx, y1 - ry, 1]^T（apply_matrix的center为(rx, ry)），平移分量即旋转中心，
+    单独施加时与alg.rotate的运算顺序相同
+    """
+    rad = r / 180 * math.pi
+    cos, sin = math.cos(rad), math.sin(rad)
+    return np.array([[cos, -sin, rx],
+                     [sin, cos, ry],
+                     [0, 0, 1.0]])
+
+
+def scale_matrix(sx, sy, s):
+    """以(sx, sy)为中心缩放s倍的齐次矩阵，与rotate_matrix一样作用于相对中心的坐标"""
+    return np.array([[s, 0, sx],
+                     [0, s, sy],
+                     [0, 0, 1.0]])
+
+
+def apply_matrix(p_list, matrix, center=(0, 0)):
+    """对全部控制点一次性施加齐次变换，结果向零取整（与alg.translate/rotate/scale的int()相同）
+
+    逐元素按 (x1 - cx)·m00 + (y1 - cy)·m01 + m02 计算而不用矩阵乘法，只施加一次平移、旋转或缩放时与cg_algorithms逐位相同
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 图元参数
+    :param matrix: (np.ndarray of float: (3, 3)) 齐次变换矩阵，作用于相对center的坐标
+    :param center: (tuple of int) 变换中心，见rotate_matrix
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], ...]) 变换后的图元参数
+    """
+    if len(p_list) == 0:
+        return []
+    points = np.asarray(p_list, float).reshape(-1, 2)
+    u, v = points[:, 0] - center[0], points[:, 1] - center[1]
+    x = u * matrix[0, 0] + v * matrix[0, 1] + matrix[0, 2]
+    y = u * matrix[1, 0] + v * matrix[1, 1] + matrix[1, 2]
+    return np.trunc(np.stack([x, y], axis=1)).astype(int).tolist()
+
+
+def _clip_params(x0, y0, x1, y1, x_min, y_min, x_max, y_max):
+    """Liang-Barsky：线段 P(t) = P0 + t·(P1 - P0) 落在窗口内的参数区间
+
+    :return: (np.ndarray of float, np.ndarray of float, np.ndarray of bool) 每条线段的t_low、t_high，及其是否与窗口相交
+    """
+    dx, dy = x1 - x0, y1 - y0
+    d = np.stack([-dx, dx, -dy, dy], axis=1)
+    q = np.stack([x0 - x_min, x_max - x0, y0 - y_min, y_max - y0], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = q / d
+    t_low = np.where(d < 0, t, 0).max(axis=1, initial=0)
+    t_high = np.where(d > 0, t, 1).min(axis=1, initial=1)
+    visible = ~((d == 0) & (q < 0)).any(axis=1) & (t_low <= t_high)
+    return t_low, t_high, visible
+
+
+def clip_lines(segments, x_min, y_min, x_max, y_max):
+    """批量Liang-Barsky裁剪：M条线段对同一裁剪窗口一次向量化裁剪
+
+    各线段四条边界的参数t一次求出，可见当且仅当没有平行于边界且在其外侧的情况，并且 max(0, 入点t) <= min(1, 出点t)，
+    与逐条边界依次收缩[tL, tU]的结果相同
+    :param segments: (array-like of int: (M, 2, 2)或(M, 4)) 每行为一条线段的 [x0, y0, x1, y1]
+    :param x_min, y_min, x_max, y_max: (int) 裁剪窗口
+    :return: (np.ndarray of int64: (M, 4), np.ndarray of bool: (M,)) 裁剪后的线段及其是否可见；
+             可见线段与逐条调用alg.clip(..., 'Liang-Barsky')的结果相同，不可见线段的坐标无意义
+    """
+    seg = np.asarray(segments, np.int64).reshape(-1, 4)
+    x0, y0, x1, y1 = seg.T
+    dx, dy = x1 - x0, y1 - y0
+    t_low, t_high, visible = _clip_params(x0, y0, x1, y1, x_min, y_min, x_max, y_max)
+    # 与标量版本相同：先由原起点求终点，再求起点，int()向零取整
+    clipped = np.column_stack((np.where(t_low > 0, np.trunc(x0 + t_low * dx), x0),
+                               np.where(t_low > 0, np.trunc(y0 + t_low * dy), y0),
+                               np.where(t_high < 1, np.trunc(x0 + t_high * dx), x1),
+                               np.where(t_high < 1, np.trunc(y0 + t_high * dy), y1)))
+    return clipped.astype(np.int64), visible